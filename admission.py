@@ -0,0 +1,116 @@
+import threading
+from contextlib import contextmanager
+from timeit import default_timer as timer
+from typing import Dict, Optional
+
+# local
+from .metrics import ADMISSION_REJECTED, ADMISSION_WAITING
+from .setup import P
+
+logger = P.logger
+
+
+class AdmissionRejected(Exception):
+    """too many lookups in flight"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Too many lookups in flight ({reason}). Retry after {retry_after} seconds")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """caps concurrent lookups globally and per client (api key)
+
+    Callers over the caps wait in a bounded queue for at most max_wait seconds, and are rejected at once when
+    the queue is full. 0 means unlimited for every limit. Internal callers pass key None: they count toward the
+    global cap only.
+    """
+
+    ema_alpha: float = 0.2  # weight of the latest lookup duration
+
+    def __init__(self, max_inflight: int = 0, max_per_key: int = 0, max_queue: int = 0, max_wait: float = 0):
+        self.cond = threading.Condition()
+        self.inflight = 0
+        self.inflight_by_key: Dict[str, int] = {}
+        self.waiting = 0
+        self.avg_duration = 5.0  # seconds, for retry_after
+        self.counters = {"admitted": 0, "rejected": 0}
+        self.configure(max_inflight, max_per_key, max_queue, max_wait)
+
+    def configure(self, max_inflight: int, max_per_key: int, max_queue: int, max_wait: float) -> None:
+        with self.cond:
+            self.max_inflight = max(max_inflight, 0)
+            self.max_per_key = max(max_per_key, 0)
+            self.max_queue = max(max_queue, 0)
+            self.max_wait = max(max_wait, 0)
+            self.cond.notify_all()
+
+    def _can_run(self, key: Optional[str]) -> bool:
+        if self.max_inflight and self.inflight >= self.max_inflight:
+            return False
+        if key is not None and self.max_per_key and self.inflight_by_key.get(key, 0) >= self.max_per_key:
+            return False
+        return True
+
+    def _retry_after(self) -> int:
+        slots = self.max_inflight or max(self.inflight, 1)
+        return max(1, round(self.avg_duration * (1 + self.waiting / slots)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.counters["rejected"] += 1
+        ADMISSION_REJECTED.inc(reason=reason)
+        return AdmissionRejected(reason, self._retry_after())
+
+    @contextmanager
+    def admit(self, key: Optional[str] = None):
+        with self.cond:
+            if not self._can_run(key):
+                if self.max_queue and self.waiting >= self.max_queue:
+                    raise self._reject("queue_full")
+                self.waiting += 1
+                ADMISSION_WAITING.inc()
+                try:
+                    deadline = timer() + self.max_wait
+                    while not self._can_run(key):
+                        timeleft = deadline - timer()
+                        if timeleft <= 0:
+                            raise self._reject("timeout")
+                        self.cond.wait(timeleft)
+                finally:
+                    self.waiting -= 1
+                    ADMISSION_WAITING.dec()
+            self.inflight += 1
+            if key is not None:
+                self.inflight_by_key[key] = self.inflight_by_key.get(key, 0) + 1
+            self.counters["admitted"] += 1
+        stime = timer()
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.inflight -= 1
+                if key is not None:
+                    self.inflight_by_key[key] -= 1
+                    if not self.inflight_by_key[key]:
+                        del self.inflight_by_key[key]
+                self.avg_duration = self.ema_alpha * (timer() - stime) + (1 - self.ema_alpha) * self.avg_duration
+                self.cond.notify_all()
+
+    def fan_out(self, max_workers: int) -> int:
+        """concurrency for the items of a single request, so that they never queue behind each other"""
+        return min(max_workers, self.max_per_key) if self.max_per_key else max_workers
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {
+                "inflight": self.inflight,
+                "waiting": self.waiting,
+                "keys": len(self.inflight_by_key),
+                "max_inflight": self.max_inflight,
+                "max_per_key": self.max_per_key,
+                "max_queue": self.max_queue,
+                "max_wait": self.max_wait,
+                "avg_duration": self.avg_duration,
+                **self.counters,
+            }
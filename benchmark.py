@@ -0,0 +1,313 @@
+"""offline benchmark of torrent_info against a loopback swarm
+
+A local HTTP tracker and seeding libtorrent sessions on 127.0.0.1 serve generated torrents, so that
+metadata lookups, torrent conversions and cache paths can be measured without any network access.
+It runs outside FlaskFarm, e.g.
+
+    python benchmark.py --copies 4 --tiny-files 100000 --concurrency 8 --output bench_output.txt
+
+and prints latency percentiles, throughput and peak RSS as JSON.
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from timeit import default_timer as timer
+from typing import Callable, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+PACKAGE = "torrent_info"
+
+
+def load_package():
+    """imports modules of this plugin without FlaskFarm by providing the bare minimum of setup.P"""
+    if PACKAGE not in sys.modules:
+        pkg = types.ModuleType(PACKAGE)
+        pkg.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+        sys.modules[PACKAGE] = pkg
+    if f"{PACKAGE}.setup" not in sys.modules:
+        setup = types.ModuleType(f"{PACKAGE}.setup")
+        setup.P = types.SimpleNamespace(logger=logging.getLogger(PACKAGE), package_name=PACKAGE)
+        sys.modules[f"{PACKAGE}.setup"] = setup
+    util = importlib.import_module(f"{PACKAGE}.util")
+    cache = importlib.import_module(f"{PACKAGE}.cache")
+    return util, cache
+
+
+class TrackerHandler(BaseHTTPRequestHandler):
+    """minimal HTTP tracker answering compact peer lists"""
+
+    peers: Dict[bytes, Dict[bytes, int]] = {}  # info_hash -> peer_id -> port
+    lock = threading.Lock()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        import libtorrent as lt  # pylint: disable=import-error
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query.encode("latin-1"), keep_blank_values=True)
+        info_hash = query.get(b"info_hash", [b""])[0]
+        peer_id = query.get(b"peer_id", [b""])[0]
+        port = int(query.get(b"port", [b"0"])[0])
+        event = query.get(b"event", [b""])[0]
+        with self.lock:
+            swarm = self.peers.setdefault(info_hash, {})
+            if event == b"stopped":
+                swarm.pop(peer_id, None)
+            elif int(query.get(b"left", [b"1"])[0]) == 0:
+                swarm[peer_id] = port  # only seeders are worth handing out
+            compact = b"".join(
+                bytes([127, 0, 0, 1]) + p.to_bytes(2, "big") for pid, p in swarm.items() if pid != peer_id
+            )
+        body = lt.bencode({"interval": 30, "complete": len(swarm), "incomplete": 0, "peers": compact})
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class LoopbackSwarm:
+    """generated torrents seeded by libtorrent sessions on 127.0.0.1 behind a local tracker"""
+
+    def __init__(self, base_dir: str, num_seeders: int = 1):
+        self.base_dir = base_dir
+        self.num_seeders = max(num_seeders, 1)
+        self.tracker = ThreadingHTTPServer(("127.0.0.1", 0), TrackerHandler)
+        self.announce_url = f"http://127.0.0.1:{self.tracker.server_address[1]}/announce"
+        self.seeders = []
+        self.torrents: List[bytes] = []  # bencoded .torrent files
+
+    def make_data(self, name: str, num_files: int, file_size: int) -> str:
+        data_dir = os.path.join(self.base_dir, "data", name)
+        os.makedirs(data_dir, exist_ok=True)
+        for idx in range(num_files):
+            sub_dir = os.path.join(data_dir, f"{idx // 1000:04d}")
+            os.makedirs(sub_dir, exist_ok=True)
+            with open(os.path.join(sub_dir, f"file{idx:06d}.bin"), "wb") as f:
+                f.write(os.urandom(min(file_size, 4096)))
+                if file_size > 4096:
+                    f.truncate(file_size)
+        return data_dir
+
+    def make_torrents(self, data_dir: str, copies: int) -> None:
+        """copies share the data through symlinks but differ in name, hence in info_hash"""
+        import libtorrent as lt  # pylint: disable=import-error
+
+        for copy_idx in range(copies):
+            name = f"{os.path.basename(data_dir)}-{copy_idx}"
+            link = os.path.join(self.base_dir, name)
+            if not os.path.exists(link):
+                os.symlink(data_dir, link)
+            fs = lt.file_storage()
+            lt.add_files(fs, data_dir)
+            fs.set_name(name)
+            ct = lt.create_torrent(fs)
+            ct.add_tracker(self.announce_url)
+            ct.set_creator("torrent_info benchmark")
+            lt.set_piece_hashes(ct, self.base_dir)
+            self.torrents.append(lt.bencode(ct.generate()))
+
+    def start(self) -> None:
+        import libtorrent as lt  # pylint: disable=import-error
+
+        threading.Thread(target=self.tracker.serve_forever, daemon=True).start()
+        settings = {
+            "listen_interfaces": "127.0.0.1:0",
+            "enable_dht": False,
+            "enable_lsd": False,
+            "enable_upnp": False,
+            "enable_natpmp": False,
+            "allow_multiple_connections_per_ip": True,
+            "alert_mask": 0,
+        }
+        for _ in range(self.num_seeders):
+            sess = lt.session(settings)
+            for torrent_file in self.torrents:
+                atp = lt.add_torrent_params()
+                atp.ti = lt.torrent_info(lt.bdecode(torrent_file))
+                atp.save_path = self.base_dir
+                atp.flags |= lt.torrent_flags.seed_mode
+                sess.add_torrent(atp)
+            self.seeders.append(sess)
+
+    def wait_ready(self, timeout: float = 60) -> None:
+        deadline = timer() + timeout
+        while timer() < deadline:
+            with TrackerHandler.lock:
+                ready = sum(1 for swarm in TrackerHandler.peers.values() if len(swarm) >= self.num_seeders)
+            if ready >= len(self.torrents):
+                return
+            time.sleep(0.1)
+        raise TimeoutError(f"Seeders did not announce within {timeout} seconds")
+
+    def magnet_uris(self) -> List[str]:
+        import libtorrent as lt  # pylint: disable=import-error
+
+        return [lt.make_magnet_uri(lt.torrent_info(lt.bdecode(t))) + "&tr=" + self.announce_url for t in self.torrents]
+
+    def stop(self) -> None:
+        for sess in self.seeders:
+            sess.pause()
+        self.seeders.clear()
+        self.tracker.shutdown()
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return None
+    idx = min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)
+    return values[idx]
+
+
+def measure(name: str, func: Callable, items: list, concurrency: int) -> dict:
+    """runs func over items with concurrency and summarizes latencies"""
+    latencies, errors = [], []
+
+    def run(item):
+        stime = timer()
+        try:
+            func(item)
+        except Exception as e:
+            errors.append(repr(e))
+            return
+        latencies.append(timer() - stime)
+
+    stime = timer()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        list(executor.map(run, items))
+    wall = timer() - stime
+    return {
+        "name": name,
+        "count": len(items),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "concurrency": concurrency,
+        "wall_time": wall,
+        "throughput": len(latencies) / wall if wall > 0 else None,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if latencies else None,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(args) -> dict:
+    util, cache = load_package()
+    LibTorrent = util.LibTorrent
+
+    import libtorrent as lt  # pylint: disable=import-error
+
+    # loopback only: no dht, no port mapping, os-assigned ports
+    LibTorrent.lt_settings = {
+        **LibTorrent.lt_settings,
+        "listen_interfaces": "127.0.0.1:0",
+        "dht_bootstrap_nodes": "",
+        "enable_upnp": False,
+        "enable_natpmp": False,
+        "allow_multiple_connections_per_ip": True,
+    }
+
+    base_dir = tempfile.mkdtemp(prefix="torrent_info_bench_")
+    result = {"version": lt.version, "args": vars(args), "results": []}
+    try:
+        swarm = LoopbackSwarm(base_dir, num_seeders=args.seeders)
+        stime = timer()
+        if args.large_files > 0:
+            swarm.make_torrents(swarm.make_data("large", args.large_files, args.large_size), args.copies)
+        if args.tiny_files > 0:
+            swarm.make_torrents(swarm.make_data("tiny", args.tiny_files, args.tiny_size), args.copies)
+        result["setup_time"] = timer() - stime
+        swarm.start()
+        swarm.wait_ready()
+
+        magnets = swarm.magnet_uris() * args.rounds
+        result["results"].append(
+            measure(
+                "get_metadata",
+                lambda uri: LibTorrent.parse_magnet_uri(uri).get_metadata(timeout=args.timeout, n_try=1),
+                magnets,
+                args.concurrency,
+            )
+        )
+
+        torrents = swarm.torrents * args.rounds
+        result["results"].append(measure("from_torrent_file", LibTorrent.from_torrent_file, torrents, args.concurrency))
+        parsed = [LibTorrent.from_torrent_file(t) for t in swarm.torrents]
+        result["results"].append(measure("to_dict", lambda t: t.to_dict(), parsed * args.rounds, args.concurrency))
+        result["results"].append(measure("to_file", lambda t: t.to_file(), parsed * args.rounds, args.concurrency))
+
+        # cache paths used by LogicMain
+        tc = cache.TorrentCache(os.path.join(base_dir, "cache.db"), PACKAGE)
+        info = parsed[0].to_dict() if parsed else {"name": "", "creation_date": "", "total_size": 0, "num_files": 0}
+        entries = [dict(info, info_hash=f"{idx:040x}") for idx in range(args.cache_entries)]
+        result["results"].append(
+            measure("cache_put", lambda info: tc.__setitem__(info["info_hash"], {"info": info}), entries, 1)
+        )
+        result["results"].append(measure("cache_hit", lambda info: tc[info["info_hash"]], entries, args.concurrency))
+        pagesize = 20
+
+        def scroll(_):
+            cursor = None
+            for _ in range(args.cache_pages):
+                _, _, cursor = tc.search(cursor=cursor, limit=pagesize)
+                if cursor is None:
+                    break
+
+        result["results"].append(measure("cache_list_pages", scroll, [None] * args.rounds, 1))
+        result["cache_stats"] = tc.stats()
+        tc.close()
+
+        swarm.stop()
+        LibTorrent.close_session_pool()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=4, help="distinct torrents per data set")
+    parser.add_argument("--large-files", type=int, default=4, help="files in the large data set (0 to skip)")
+    parser.add_argument("--large-size", type=int, default=16 * 1024 * 1024, help="bytes per large file")
+    parser.add_argument("--tiny-files", type=int, default=10000, help="files in the tiny data set (0 to skip)")
+    parser.add_argument("--tiny-size", type=int, default=16, help="bytes per tiny file")
+    parser.add_argument("--seeders", type=int, default=1, help="seeding sessions")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3, help="repetitions of each operation")
+    parser.add_argument("--timeout", type=int, default=30, help="seconds per metadata lookup")
+    parser.add_argument("--cache-entries", type=int, default=10000)
+    parser.add_argument("--cache-pages", type=int, default=50, help="pages to scroll per cache_list_pages")
+    parser.add_argument("--output", default="", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    result = json.dumps(run_benchmark(args), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(result)
+    else:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
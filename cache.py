@@ -0,0 +1,1048 @@
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from timeit import default_timer as timer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# local
+from .codec import (
+    Codec,
+    decode_value,
+    default_codec,
+    restore_derived,
+    restore_files,
+    strip_derived,
+    strip_files,
+    value_format,
+)
+from .metrics import DB_SECONDS
+from .setup import P
+from .util import summarize
+
+logger = P.logger
+
+
+def tokenize(name: str) -> List[str]:
+    """words of a file name split on anything but letters and digits"""
+    return [t for t in re.split(r"[\W_]+", name) if t]
+
+
+class MetadataBackoffError(Exception):
+    """raised when a magnet recently timed out and is still inside its backoff window"""
+
+    def __init__(self, info_hash: str, retry_after: int, failures: int):
+        super().__init__(f"No metadata for {info_hash} after {failures} attempt(s). Retry after {retry_after} seconds")
+        self.info_hash = info_hash
+        self.retry_after = retry_after
+        self.failures = failures
+
+
+class NegativeCache:
+    """in-memory record of magnets that timed out, with exponential backoff per info_hash"""
+
+    backoff_base: int = 60
+    backoff_factor: int = 2
+    backoff_max: int = 24 * 60 * 60
+    max_entries: int = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: Dict[str, list] = {}  # info_hash -> [failures, retry_at]
+        self.counters = {"hits": 0, "misses": 0}
+
+    def check(self, info_hash: str) -> None:
+        """raises MetadataBackoffError if info_hash is inside its backoff window"""
+        with self.lock:
+            entry = self.entries.get(info_hash)
+            now = time.time()
+            if entry is None or entry[1] <= now:
+                self.counters["misses"] += 1
+                return
+            self.counters["hits"] += 1
+            failures, retry_at = entry
+        raise MetadataBackoffError(info_hash, int(retry_at - now) + 1, failures)
+
+    def record_failure(self, info_hash: str) -> None:
+        with self.lock:
+            failures = self.entries.get(info_hash, [0, 0])[0] + 1
+            backoff = min(self.backoff_base * self.backoff_factor ** (failures - 1), self.backoff_max)
+            self.entries[info_hash] = [failures, time.time() + backoff]
+            if len(self.entries) > self.max_entries:
+                self._prune()
+
+    def record_success(self, info_hash: str) -> None:
+        with self.lock:
+            self.entries.pop(info_hash, None)
+
+    def _prune(self) -> None:
+        # forget entries whose window has passed long enough ago
+        expire = time.time() - self.backoff_max
+        for info_hash in [h for h, (_, retry_at) in self.entries.items() if retry_at < expire]:
+            del self.entries[info_hash]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            now = time.time()
+            active = sum(1 for _, retry_at in self.entries.values() if retry_at > now)
+            return {"entries": len(self.entries), "active": active, **self.counters}
+
+
+class TorrentMetaStore:
+    """bencoded torrent files keyed by info_hash, compressed by zlib
+
+    It shares the table layout of SqliteDict (key, value) so that rows written by older versions stay readable.
+    """
+
+    def __init__(self, cache: "TorrentCache", tablename: str):
+        self.cache = cache
+        self.tablename = tablename
+        with cache.lock:
+            cache.conn.execute(f'CREATE TABLE IF NOT EXISTS "{tablename}" (key TEXT PRIMARY KEY, value BLOB)')
+
+    def __contains__(self, info_hash: str) -> bool:
+        if info_hash in self.cache.pending_meta:
+            return True
+        return self.cache.fetchone(f'SELECT 1 FROM "{self.tablename}" WHERE key = ?', (info_hash,)) is not None
+
+    def __getitem__(self, info_hash: str) -> bytes:
+        value = self.cache.pending_meta.get(info_hash)
+        if value is None:
+            row = self.cache.fetchone(f'SELECT value FROM "{self.tablename}" WHERE key = ?', (info_hash,))
+            if row is None:
+                raise KeyError(info_hash)
+            value = row[0]
+        return zlib.decompress(value)
+
+    def __setitem__(self, info_hash: str, torrent_file: bytes) -> None:
+        self.cache.queue_write(info_hash, meta=zlib.compress(torrent_file))
+
+    def put_row(self, info_hash: str, value: bytes, update_size: bool = True) -> None:
+        """called by the writer of the cache within its transaction"""
+        self.cache.conn.execute(f'REPLACE INTO "{self.tablename}" (key, value) VALUES (?, ?)', (info_hash, value))
+        if update_size:
+            self.cache.conn.execute(
+                f'UPDATE "{self.cache.table}" SET size_bytes = length(info) + ? + '
+                f'COALESCE((SELECT length(files) FROM "{self.cache.files_table}" WHERE info_hash = ?), 0) '
+                "WHERE info_hash = ?",
+                (len(value), info_hash, info_hash),
+            )
+
+    def __delitem__(self, info_hash: str) -> None:
+        with self.cache.write_lock:
+            self.cache.pending_meta.pop(info_hash, None)
+        self.cache.execute(f'DELETE FROM "{self.tablename}" WHERE key = ?', (info_hash,))
+
+    def clear(self) -> None:
+        with self.cache.write_lock:
+            self.cache.pending_meta.clear()
+        self.cache.execute(f'DELETE FROM "{self.tablename}"')
+
+
+class TorrentCache:
+    """torrent info cache backed by indexed columns and an FTS5 name index
+
+    Values are returned as {"info": info} just like the SqliteDict it replaces.
+    File lists are kept compressed in a separate table so that listings and summaries never load them.
+    Both are encoded by codec.
+    Entries are bounded by limits (max entries, max bytes, max age) and evicted in a background thread
+    in the order of last access.
+
+    The db runs in WAL mode. Reads go through a small pool of connections and never wait for writes,
+    while writes are queued and committed in batches by a single writer thread. Queued entries are
+    visible to lookups by info_hash right away, and to listings after the next flush.
+    """
+
+    evict_interval: int = 60  # seconds between background runs
+    evict_batch: int = 500
+    flush_interval: float = 1.0  # seconds writes may wait in queue
+    flush_size: int = 200  # queued entries that trigger a flush
+    max_readers: int = 8
+
+    def __init__(self, db_file: str, prefix: str, codec: Codec = None):
+        self.db_file = db_file
+        self.prefix = prefix
+        self.codec = codec or default_codec()
+        self.table = f"{prefix}_torrents"
+        self.fts_table = f"{prefix}_names_fts"
+        self.lock = threading.RLock()  # for the write connection
+        self.conn = self.connect()
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.readers: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=self.max_readers)
+        self.use_fts = False
+        self.meta_table = f"{prefix}_meta"
+        self.files_table = f"{prefix}_files"
+        self.file_paths_table = f"{prefix}_file_paths"
+        self.file_tokens_table = f"{prefix}_file_tokens"
+        self.urls_table = f"{prefix}_urls"
+        self.version_table = f"{prefix}_version"
+
+        # write-behind queue: info_hash -> info / compressed torrent file
+        self.write_lock = threading.Lock()
+        self.pending_infos: Dict[str, dict] = {}
+        self.pending_meta: Dict[str, bytes] = {}
+        self.write_event = threading.Event()
+        self.writer_thread: Optional[threading.Thread] = None
+
+        # last access times of cache hits, written to db by the evictor
+        self.access_lock = threading.Lock()
+        self.pending_access: Dict[str, float] = {}
+
+        # limits: 0 means unlimited. max_bytes in bytes, max_age in seconds
+        self.limits = {"max_entries": 0, "max_bytes": 0, "max_age": 0}
+        self.counters = {"evicted_expired": 0, "evicted_lru": 0, "last_eviction": None}
+        self.evict_event = threading.Event()
+        self.evict_thread: Optional[threading.Thread] = None
+
+        self.create_tables()
+        self.meta = TorrentMetaStore(self, self.meta_table)
+        self.legacy_table = f"{prefix}_cache"  # moved into the tables above by the evictor thread
+
+    def create_tables(self) -> None:
+        with self.lock:
+            self.conn.executescript(
+                f"""
+                CREATE TABLE IF NOT EXISTS "{self.table}" (
+                    id INTEGER PRIMARY KEY,  -- stable rowid the name index is keyed by, kept by VACUUM
+                    info_hash TEXT NOT NULL UNIQUE,
+                    name TEXT NOT NULL DEFAULT '',
+                    creation_date TEXT NOT NULL DEFAULT '',
+                    total_size INTEGER NOT NULL DEFAULT 0,
+                    num_files INTEGER NOT NULL DEFAULT 0,
+                    cached_at REAL NOT NULL DEFAULT (strftime('%s', 'now')),
+                    last_access REAL NOT NULL DEFAULT (strftime('%s', 'now')),
+                    size_bytes INTEGER NOT NULL DEFAULT 0,
+                    stats_updated_at REAL NOT NULL DEFAULT 0,  -- seeders/peers refreshed by scrape
+                    info TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS "{self.table}_creation_date" ON "{self.table}" (creation_date, info_hash);
+                CREATE INDEX IF NOT EXISTS "{self.table}_cached_at" ON "{self.table}" (cached_at);
+                CREATE INDEX IF NOT EXISTS "{self.table}_last_access" ON "{self.table}" (last_access);
+                CREATE INDEX IF NOT EXISTS "{self.table}_total_size" ON "{self.table}" (total_size);
+                CREATE INDEX IF NOT EXISTS "{self.table}_stats_updated_at" ON "{self.table}" (stats_updated_at);
+                CREATE TABLE IF NOT EXISTS "{self.files_table}" (
+                    info_hash TEXT PRIMARY KEY,
+                    files BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS "{self.file_paths_table}" (
+                    id INTEGER PRIMARY KEY,
+                    info_hash TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS "{self.file_paths_table}_info_hash" ON "{self.file_paths_table}" (info_hash);
+                CREATE INDEX IF NOT EXISTS "{self.file_paths_table}_name" ON "{self.file_paths_table}" (name, size);
+                CREATE INDEX IF NOT EXISTS "{self.file_paths_table}_size" ON "{self.file_paths_table}" (size);
+                CREATE TABLE IF NOT EXISTS "{self.file_tokens_table}" (
+                    token TEXT NOT NULL,
+                    file_id INTEGER NOT NULL,
+                    PRIMARY KEY (token, file_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS "{self.file_tokens_table}_file_id" ON "{self.file_tokens_table}" (file_id);
+                CREATE TABLE IF NOT EXISTS "{self.urls_table}" (
+                    url TEXT PRIMARY KEY,
+                    info_hash TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS "{self.version_table}" (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    version INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO "{self.version_table}" (id, version) VALUES (0, 0);
+                """
+            )
+            exists = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.fts_table,)
+            ).fetchone()
+            try:
+                # external content keyed by id of the main table: rows are deleted by id, no copy of names.
+                # trigram keeps the substring semantics of the LIKE fallback
+                self.conn.execute(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS "{self.fts_table}" '
+                    f"USING fts5(name, content='{self.table}', content_rowid='id', tokenize='trigram')"
+                )
+                if not exists:
+                    # rows cached while fts5 was not available
+                    self.conn.execute(f'INSERT INTO "{self.fts_table}" ("{self.fts_table}") VALUES (\'rebuild\')')
+                self.use_fts = True
+            except sqlite3.OperationalError as e:
+                logger.warning("FTS5 is not available, falling back to LIKE search: %s", e)
+
+    def migrate(self) -> int:
+        """moves rows of the SqliteDict table used by older versions into indexed columns
+
+        Entries still waiting in the old table are misses until moved. Ones cached again meanwhile are kept.
+        """
+        migrated = 0
+        while True:
+            with self.lock:
+                exists = self.conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.legacy_table,)
+                ).fetchone()
+                if not exists:
+                    break
+                rows = self.conn.execute(
+                    f'SELECT key, value FROM "{self.legacy_table}" LIMIT {self.evict_batch}'
+                ).fetchall()
+                self.conn.execute("BEGIN")
+                try:
+                    if rows:
+                        for _, value in rows:
+                            info = json.loads(value)["info"]
+                            if not self.conn.execute(
+                                f'SELECT 1 FROM "{self.table}" WHERE info_hash = ?', (info["info_hash"],)
+                            ).fetchone():
+                                self._put(info)
+                        self.conn.executemany(
+                            f'DELETE FROM "{self.legacy_table}" WHERE key = ?', [row[:1] for row in rows]
+                        )
+                    else:
+                        self.conn.execute(f'DROP TABLE "{self.legacy_table}"')
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            migrated += len(rows)
+            time.sleep(0.1)  # yield the lock to request threads
+        if migrated:
+            logger.info("Migrated %d entries of torrent cache from '%s'", migrated, self.legacy_table)
+        return migrated
+
+    def connect(self) -> sqlite3.Connection:
+        # other processes may hold the write lock for a while
+        return sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None, timeout=30)
+
+    @contextmanager
+    def reader(self):
+        try:
+            conn = self.readers.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        finally:
+            try:
+                self.readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        with DB_SECONDS.time(op="read"), self.reader() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with DB_SECONDS.time(op="read"), self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def execute(self, sql: str, params: tuple = ()) -> None:
+        with DB_SECONDS.time(op="write"), self.lock:
+            self.conn.execute(sql, params)
+
+    def encode_info(self, info: dict) -> bytes:
+        return self.codec.encode(strip_derived(info))
+
+    @staticmethod
+    def decode_info(value) -> dict:
+        return restore_derived(decode_value(value))
+
+    def encode_files(self, files: List[dict]) -> bytes:
+        return self.codec.encode(strip_files(files))
+
+    @staticmethod
+    def decode_files(value) -> List[dict]:
+        return restore_files(decode_value(value))
+
+    def _put_files(self, info_hash: str, files: List[dict]) -> int:
+        blob = self.encode_files(files)
+        self.conn.execute(f'REPLACE INTO "{self.files_table}" (info_hash, files) VALUES (?, ?)', (info_hash, blob))
+        self._index_files(info_hash, files)
+        return len(blob)
+
+    def _unindex_files(self, where: str, params: tuple = ()) -> None:
+        """drops files of the torrents selected by where (on info_hash) from the file index"""
+        self.conn.execute(
+            f'DELETE FROM "{self.file_tokens_table}" WHERE file_id IN '
+            f'(SELECT id FROM "{self.file_paths_table}" WHERE {where})',
+            params,
+        )
+        self.conn.execute(f'DELETE FROM "{self.file_paths_table}" WHERE {where}', params)
+
+    def _index_files(self, info_hash: str, files: List[dict]) -> None:
+        """(name, size) of every file in the torrent and an inverted index of the tokens of its path"""
+        self._unindex_files("info_hash = ?", (info_hash,))
+        for f in files:
+            path = f["path"].replace("\\", "/")
+            name = path.rsplit("/", 1)[-1].lower()
+            file_id = self.conn.execute(
+                f'INSERT INTO "{self.file_paths_table}" (info_hash, path, name, size) VALUES (?, ?, ?, ?)',
+                (info_hash, path, name, f["size"]),
+            ).lastrowid
+            self.conn.executemany(
+                f'INSERT INTO "{self.file_tokens_table}" (token, file_id) VALUES (?, ?)',
+                [(t, file_id) for t in set(tokenize(path.lower()))],
+            )
+
+    def _bump_version(self) -> None:
+        """marks listings as changed, within the transaction of the write. shared by all processes using the db"""
+        self.conn.execute(f'UPDATE "{self.version_table}" SET version = version + 1 WHERE id = 0')
+
+    def _put(self, info: dict, cached_at: float = None) -> None:
+        self._bump_version()
+        info_hash = info["info_hash"]
+        files_bytes = 0
+        if "files" in info:
+            files_bytes = self._put_files(info_hash, info["files"])
+            info = summarize(info)
+        value = self.encode_info(info)
+        now = time.time()
+        if self.use_fts:
+            self._fts_delete(f'SELECT id, name FROM "{self.table}" WHERE info_hash = ?', (info_hash,))
+        cursor = self.conn.execute(
+            f'REPLACE INTO "{self.table}" '
+            "(info_hash, name, creation_date, total_size, num_files, cached_at, last_access, stats_updated_at, "
+            "size_bytes, info) "
+            f'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ? + COALESCE((SELECT length(value) FROM "{self.meta_table}" WHERE key = ?), 0), ?)',
+            (
+                info_hash,
+                info.get("name", ""),
+                info.get("creation_date", ""),
+                info.get("total_size", 0),
+                info.get("num_files", 0),
+                now if cached_at is None else cached_at,
+                now,
+                now if "seeders" in info else 0,  # from the swarm metadata was fetched from
+                len(value) + files_bytes,
+                info_hash,
+                value,
+            ),
+        )
+        if self.use_fts:
+            # REPLACE gives the row a new id
+            self.conn.execute(
+                f'INSERT INTO "{self.fts_table}" (rowid, name) VALUES (?, ?)', (cursor.lastrowid, info.get("name", ""))
+            )
+
+    def _fts_delete(self, select_sql: str, params: tuple = ()) -> None:
+        """removes rows of the main table given by select_sql (id, name) from the name index, before they change.
+        external content tables need the indexed values to delete
+        """
+        self.conn.execute(
+            f'INSERT INTO "{self.fts_table}" ("{self.fts_table}", rowid, name) SELECT \'delete\', * FROM ({select_sql})',
+            params,
+        )
+
+    def _delete(self, info_hash: str) -> None:
+        self._bump_version()
+        if self.use_fts:
+            self._fts_delete(f'SELECT id, name FROM "{self.table}" WHERE info_hash = ?', (info_hash,))
+        self.conn.execute(f'DELETE FROM "{self.table}" WHERE info_hash = ?', (info_hash,))
+        self.conn.execute(f'DELETE FROM "{self.files_table}" WHERE info_hash = ?', (info_hash,))
+        self._unindex_files("info_hash = ?", (info_hash,))
+
+    def _delete_many(self, infohashes: List[str]) -> None:
+        self._bump_version()
+        placeholders = ",".join("?" * len(infohashes))
+        if self.use_fts:
+            self._fts_delete(f'SELECT id, name FROM "{self.table}" WHERE info_hash IN ({placeholders})', infohashes)
+        self.conn.execute(f'DELETE FROM "{self.table}" WHERE info_hash IN ({placeholders})', infohashes)
+        self.conn.execute(f'DELETE FROM "{self.meta_table}" WHERE key IN ({placeholders})', infohashes)
+        self.conn.execute(f'DELETE FROM "{self.files_table}" WHERE info_hash IN ({placeholders})', infohashes)
+        self._unindex_files(f"info_hash IN ({placeholders})", tuple(infohashes))
+
+    def __contains__(self, info_hash: str) -> bool:
+        if info_hash in self.pending_infos:
+            return True
+        return self.fetchone(f'SELECT 1 FROM "{self.table}" WHERE info_hash = ?', (info_hash,)) is not None
+
+    def __getitem__(self, info_hash: str) -> dict:
+        info = self.pending_infos.get(info_hash)
+        if info is not None:
+            return {"info": info}
+        row = self.fetchone(
+            f'SELECT t.info, f.files FROM "{self.table}" t LEFT JOIN "{self.files_table}" f USING (info_hash) '
+            "WHERE t.info_hash = ?",
+            (info_hash,),
+        )
+        if row is None:
+            raise KeyError(info_hash)
+        info = self.decode_info(row[0])
+        if row[1] is not None:
+            info.pop("tree", None)
+            info["files"] = self.decode_files(row[1])
+        return {"info": info}
+
+    def version(self) -> str:
+        """changes whenever listings may change, by a write of any process"""
+        self.flush_pending()
+        return str(self.fetchone(f'SELECT version FROM "{self.version_table}" WHERE id = 0')[0])
+
+    def entry_version(self, info_hash: str) -> Optional[str]:
+        """changes whenever the entry is rewritten or its swarm stats are refreshed. None until written to db"""
+        if info_hash in self.pending_infos:
+            return None
+        row = self.fetchone(f'SELECT cached_at, stats_updated_at FROM "{self.table}" WHERE info_hash = ?', (info_hash,))
+        if row is None:
+            return None
+        return f"{row[0]!r}.{row[1]!r}"
+
+    def summary(self, info_hash: str) -> dict:
+        """info without the full file list, i.e. without touching the files table"""
+        if info_hash in self.pending_infos:
+            return summarize(self.pending_infos[info_hash])
+        row = self.fetchone(f'SELECT info FROM "{self.table}" WHERE info_hash = ?', (info_hash,))
+        if row is None:
+            raise KeyError(info_hash)
+        return summarize(self.decode_info(row[0]))
+
+    def files(self, info_hash: str, q: str = None, offset: int = 0, limit: int = 100) -> Tuple[List[dict], int]:
+        """(a page of files, total matching count) of a cached torrent, optionally filtered by path substring"""
+        if info_hash in self.pending_infos:
+            files = self.pending_infos[info_hash].get("files", [])
+        else:
+            row = self.fetchone(f'SELECT files FROM "{self.files_table}" WHERE info_hash = ?', (info_hash,))
+            files = self.decode_files(row[0]) if row is not None else []
+        if q:
+            q = q.lower()
+            files = [f for f in files if q in f["path"].lower()]
+        offset = max(offset, 0)
+        return files[offset : offset + max(limit, 0)], len(files)
+
+    def codec_stats(self, sample: int = 200) -> dict:
+        """rows and bytes by storage format, and size/decode time of the current codec against plain json
+        measured on a sample of entries
+        """
+        formats = {}
+        for table, column in [(self.table, "info"), (self.files_table, "files")]:
+            for head, count, n_bytes in self.fetchall(
+                f'SELECT substr({column}, 1, 1), COUNT(*), SUM(length({column})) FROM "{table}" GROUP BY 1'
+            ):
+                name = value_format(head)
+                entry = formats.setdefault(f"{column}:{name}", {"count": 0, "bytes": 0})
+                entry["count"] += count
+                entry["bytes"] += n_bytes or 0
+
+        infohashes = [row[0] for row in self.fetchall(f'SELECT info_hash FROM "{self.table}" LIMIT {int(sample)}')]
+        infos = [self[h]["info"] for h in infohashes if h in self]
+        json_values = [json.dumps(info).encode("utf-8") for info in infos]
+        codec_values = [self.codec.encode(strip_derived(info)) for info in infos]
+        stime = timer()
+        for value in json_values:
+            json.loads(value)
+        json_decode = timer() - stime
+        stime = timer()
+        for value in codec_values:
+            restore_derived(self.codec.decode(value))
+        codec_decode = timer() - stime
+        json_bytes, codec_bytes = sum(map(len, json_values)), sum(map(len, codec_values))
+        return {
+            "codec": self.codec.name,
+            "formats": formats,
+            "sample": {
+                "entries": len(infos),
+                "json_bytes": json_bytes,
+                "codec_bytes": codec_bytes,
+                "ratio": codec_bytes / json_bytes if json_bytes else None,
+                "json_decode_ms": json_decode * 1000,
+                "codec_decode_ms": codec_decode * 1000,
+            },
+        }
+
+    def find_by_tokens(self, q: str, limit: int = 100) -> List[str]:
+        """info_hashes of torrents having a file whose path contains every token of q
+
+        Postings of the rarest token are walked and the others are looked up by (token, file_id), so common
+        tokens like "mkv" cost no more than a key lookup each.
+        """
+        self.flush_pending()
+        tokens = set(tokenize(q.lower()))
+        if not tokens:
+            return []
+        # postings counted up to a cap: enough to tell rare from common without walking the long lists
+        cap = 10000
+        sizes = {
+            t: self.fetchone(
+                f'SELECT COUNT(*) FROM (SELECT 1 FROM "{self.file_tokens_table}" WHERE token = ? LIMIT {cap})', (t,)
+            )[0]
+            for t in tokens
+        }
+        rarest = min(tokens, key=sizes.get)
+        if not sizes[rarest]:
+            return []
+        others = sorted(tokens - {rarest})
+        exists = "".join(
+            f' AND EXISTS (SELECT 1 FROM "{self.file_tokens_table}" WHERE token = ? AND file_id = t.file_id)'
+            for _ in others
+        )
+        rows = self.fetchall(
+            f'SELECT DISTINCT p.info_hash FROM "{self.file_tokens_table}" t '
+            f'CROSS JOIN "{self.file_paths_table}" p ON p.id = t.file_id '
+            f"WHERE t.token = ?{exists} LIMIT {int(limit)}",
+            (rarest, *others),
+        )
+        return [row[0] for row in rows]
+
+    def find_files(self, name: str = None, size: int = None, path: str = None, limit: int = 100) -> List[dict]:
+        """files matching exact file name (case-insensitive), size and/or full path across cached torrents"""
+        self.flush_pending()
+        where, params = [], ()
+        if name:
+            where.append("name = ?")
+            params += (name.lower(),)
+        if size is not None:
+            where.append("size = ?")
+            params += (int(size),)
+        if path:
+            # path includes the torrent name. name is matched too so that the index is used
+            path = path.replace("\\", "/")
+            if not name:
+                where.append("name = ?")
+                params += (path.rsplit("/", 1)[-1].lower(),)
+            where.append("path = ?")
+            params += (path,)
+        if not where:
+            return []
+        rows = self.fetchall(
+            f'SELECT info_hash, path, size FROM "{self.file_paths_table}" WHERE {" AND ".join(where)} '
+            f"LIMIT {int(limit)}",
+            params,
+        )
+        return [{"info_hash": h, "path": p, "size": s} for h, p, s in rows]
+
+    def __setitem__(self, info_hash: str, value: dict) -> None:
+        _ = info_hash  # info_hash of value["info"] is used as the key
+        self.queue_write(value["info"]["info_hash"], info=value["info"])
+
+    def queue_write(self, info_hash: str, info: dict = None, meta: bytes = None) -> None:
+        with self.write_lock:
+            if info is not None:
+                self.pending_infos[info_hash] = info
+            if meta is not None:
+                self.pending_meta[info_hash] = meta
+            n_pending = len(self.pending_infos) + len(self.pending_meta)
+        if self.writer_thread is None:
+            self.flush()  # no writer running
+        elif n_pending >= self.flush_size:
+            self.write_event.set()
+
+    def flush(self) -> int:
+        """commits queued writes in a single transaction"""
+        with self.lock:
+            with self.write_lock:
+                infos, metas = dict(self.pending_infos), dict(self.pending_meta)
+            if not infos and not metas:
+                return 0
+            with DB_SECONDS.time(op="write"):
+                self.conn.execute("BEGIN")
+                try:
+                    # torrent files first as the size of a row counts them
+                    for info_hash, value in metas.items():
+                        self.meta.put_row(info_hash, value, update_size=info_hash not in infos)
+                    for info in infos.values():
+                        self._put(info)
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            with self.write_lock:
+                # unless queued again in the meantime
+                for info_hash, info in infos.items():
+                    if self.pending_infos.get(info_hash) is info:
+                        del self.pending_infos[info_hash]
+                for info_hash, value in metas.items():
+                    if self.pending_meta.get(info_hash) is value:
+                        del self.pending_meta[info_hash]
+        if any(self.limits.values()):
+            self.evict_event.set()
+        return len(infos) + len(metas)
+
+    def flush_pending(self) -> None:
+        """makes queued writes visible to queries other than lookups by info_hash"""
+        if self.pending_infos or self.pending_meta:
+            self.flush()
+
+    def _write_loop(self) -> None:
+        while self.writer_thread is not None:
+            self.write_event.wait(self.flush_interval)
+            self.write_event.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Exception while writing torrent cache:")
+                time.sleep(1)
+
+    def start_writer(self) -> None:
+        if self.writer_thread is None:
+            self.writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+            self.writer_thread.start()
+
+    def put_many(self, items: List[Tuple[dict, Optional[bytes]]], cached_at: Dict[str, float] = None) -> None:
+        """writes (info, torrent file or None) pairs in a single transaction
+
+        cached_at keeps the times entries were first cached elsewhere, e.g. on import.
+        """
+        cached_at = cached_at or {}
+        with DB_SECONDS.time(op="write"), self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for info, torrent_file in items:
+                    if torrent_file is not None:
+                        self.conn.execute(
+                            f'REPLACE INTO "{self.meta_table}" (key, value) VALUES (?, ?)',
+                            (info["info_hash"], zlib.compress(torrent_file)),
+                        )
+                    self._put(info, cached_at=cached_at.get(info["info_hash"]))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if any(self.limits.values()):
+            self.evict_event.set()
+
+    def existing(self, infohashes: List[str]) -> set:
+        """subset of infohashes already in cache"""
+        return set(self.versions(infohashes))
+
+    def versions(self, infohashes: List[str]) -> Dict[str, Tuple[str, float]]:
+        """(creation_date, cached_at) of the infohashes already in cache"""
+        self.flush_pending()
+        found = {}
+        for idx in range(0, len(infohashes), 500):
+            chunk = infohashes[idx : idx + 500]
+            rows = self.fetchall(
+                f'SELECT info_hash, creation_date, cached_at FROM "{self.table}" '
+                f'WHERE info_hash IN ({",".join("?" * len(chunk))})',
+                tuple(chunk),
+            )
+            found.update((h, (creation_date, cached_at)) for h, creation_date, cached_at in rows)
+        return found
+
+    def iter_entries(
+        self, batch_size: int = 1000, with_torrent: bool = False
+    ) -> Iterator[Tuple[dict, float, Optional[bytes]]]:
+        """(info with files, cached_at, torrent file) of all entries in info_hash order, a batch at a time"""
+        self.flush_pending()
+        sql = f'SELECT t.info_hash, t.cached_at, t.info, f.files, {"m.value" if with_torrent else "NULL"} '
+        sql += f'FROM "{self.table}" t LEFT JOIN "{self.files_table}" f USING (info_hash) '
+        if with_torrent:
+            sql += f'LEFT JOIN "{self.meta_table}" m ON m.key = t.info_hash '
+        sql += f"WHERE t.info_hash > ? ORDER BY t.info_hash LIMIT {int(batch_size)}"
+        last = ""
+        while True:
+            rows = self.fetchall(sql, (last,))
+            for info_hash, cached_at, value, files, torrent_file in rows:
+                info = self.decode_info(value)
+                if files is not None:
+                    info.pop("tree", None)
+                    info["files"] = self.decode_files(files)
+                yield info, cached_at, zlib.decompress(torrent_file) if torrent_file is not None else None
+                last = info_hash
+            if len(rows) < batch_size:
+                return
+
+    def __delitem__(self, info_hash: str) -> None:
+        with self.write_lock:
+            self.pending_infos.pop(info_hash, None)
+        with DB_SECONDS.time(op="write"), self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self._delete(info_hash)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self) -> int:
+        self.flush_pending()
+        return self.fetchone(f'SELECT COUNT(*) FROM "{self.table}"')[0]
+
+    def values(self) -> Iterator[dict]:
+        self.flush_pending()
+        for (info,) in self.fetchall(f'SELECT info FROM "{self.table}"'):
+            yield {"info": self.decode_info(info)}
+
+    def clear(self) -> None:
+        with self.write_lock:
+            self.pending_infos.clear()
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.execute(f'DELETE FROM "{self.table}"')
+                self.conn.execute(f'DELETE FROM "{self.files_table}"')
+                self.conn.execute(f'DELETE FROM "{self.file_paths_table}"')
+                self.conn.execute(f'DELETE FROM "{self.file_tokens_table}"')
+                self.conn.execute(f'DELETE FROM "{self.urls_table}"')
+                if self.use_fts:
+                    self.conn.execute(f'INSERT INTO "{self.fts_table}" ("{self.fts_table}") VALUES (\'delete-all\')')
+                self._bump_version()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _name_filter(self, name: str) -> Tuple[str, tuple]:
+        name = name.strip()
+        if self.use_fts and len(name) >= 3:
+            # trigram index needs 3 characters at least
+            query = '"' + name.replace('"', '""') + '"'
+            return f'id IN (SELECT rowid FROM "{self.fts_table}" WHERE name MATCH ?)', (query,)
+        pattern = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return "name LIKE ? ESCAPE '\\'", (f"%{pattern}%",)
+
+    def _filter(self, name: str = None, infohashes: List[str] = None) -> Tuple[List[str], tuple]:
+        if name:
+            clause, params = self._name_filter(name)
+            return [clause], params
+        if infohashes is not None:
+            return [f"info_hash IN ({','.join('?' * len(infohashes))})"], tuple(infohashes)
+        return [], ()
+
+    def count(self, name: str = None, infohashes: List[str] = None) -> int:
+        """number of entries search() would list, without reading them"""
+        self.flush_pending()
+        where, params = self._filter(name, infohashes)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        return self.fetchone(f'SELECT COUNT(*) FROM "{self.table}" {where_sql}', params)[0]
+
+    def search(
+        self,
+        name: str = None,
+        infohashes: List[str] = None,
+        cursor: str = None,
+        limit: int = None,
+    ) -> Tuple[List[dict], Optional[int], Optional[str]]:
+        """returns (info list, total count, next cursor) ordered by creation_date desc
+
+        cursor is an opaque keyset position so that every page costs the same regardless of its depth.
+        total is counted for the first page only, None for pages after a cursor.
+        infos are summaries without file lists, which are paged by files().
+        """
+        self.flush_pending()
+        where, params = self._filter(name, infohashes)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        total = None
+        if cursor:
+            creation_date, _, info_hash = cursor.partition("|")
+            where.append("(creation_date, info_hash) < (?, ?)")
+            params += (creation_date, info_hash)
+            where_sql = f"WHERE {' AND '.join(where)}"
+        else:
+            total = self.fetchone(f'SELECT COUNT(*) FROM "{self.table}" {where_sql}', params)[0]
+        sql = f'SELECT creation_date, info_hash, info FROM "{self.table}" {where_sql} '
+        sql += "ORDER BY creation_date DESC, info_hash DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self.fetchall(sql, params)
+
+        next_cursor = None
+        if rows and limit is not None and len(rows) == limit:
+            next_cursor = f"{rows[-1][0]}|{rows[-1][1]}"
+        return [summarize(self.decode_info(row[2])) for row in rows], total, next_cursor
+
+    def stale_stats(self, older_than: float, limit: int = 500) -> List[dict]:
+        """infos whose swarm stats were refreshed longest ago, before older_than"""
+        self.flush_pending()
+        rows = self.fetchall(
+            f'SELECT info FROM "{self.table}" WHERE stats_updated_at < ? ORDER BY stats_updated_at LIMIT {int(limit)}',
+            (older_than,),
+        )
+        return [self.decode_info(row[0]) for row in rows]
+
+    def update_stats(self, stats: Dict[str, dict], attempted: List[str] = ()) -> None:
+        """stores scraped seeders/peers. attempted entries without stats are only marked as tried"""
+        self.flush_pending()
+        now = time.time()
+        updated_at = datetime.fromtimestamp(now).isoformat(timespec="seconds")
+        with DB_SECONDS.time(op="write"), self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self._bump_version()
+                for info_hash, entry in stats.items():
+                    row = self.conn.execute(
+                        f'SELECT info FROM "{self.table}" WHERE info_hash = ?', (info_hash,)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    info = self.decode_info(row[0])
+                    info.update(entry)
+                    info["stats_updated_at"] = updated_at
+                    value = self.encode_info(info)
+                    self.conn.execute(
+                        f'UPDATE "{self.table}" SET info = ?, stats_updated_at = ?, '
+                        f"size_bytes = size_bytes - length(info) + ? WHERE info_hash = ?",
+                        (value, now, len(value), info_hash),
+                    )
+                self.conn.executemany(
+                    f'UPDATE "{self.table}" SET stats_updated_at = ? WHERE info_hash = ?',
+                    [(now, h) for h in attempted if h not in stats],
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def get_url(self, url: str) -> Optional[dict]:
+        """info_hash and http validators of a torrent url fetched before"""
+        row = self.fetchone(
+            f'SELECT info_hash, etag, last_modified, fetched_at FROM "{self.urls_table}" WHERE url = ?', (url,)
+        )
+        if row is None:
+            return None
+        return dict(zip(["info_hash", "etag", "last_modified", "fetched_at"], row))
+
+    def put_url(self, url: str, info_hash: str, etag: str = None, last_modified: str = None) -> None:
+        self.execute(
+            f'REPLACE INTO "{self.urls_table}" (url, info_hash, etag, last_modified, fetched_at) '
+            "VALUES (?, ?, ?, ?, ?)",
+            (url, info_hash, etag, last_modified, time.time()),
+        )
+
+    def touch(self, info_hash: str) -> None:
+        """records a cache hit without writing to db on the request thread"""
+        with self.access_lock:
+            self.pending_access[info_hash] = time.time()
+
+    def flush_access(self) -> None:
+        with self.access_lock:
+            pending, self.pending_access = self.pending_access, {}
+        if not pending:
+            return
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    f'UPDATE "{self.table}" SET last_access = ? WHERE info_hash = ?',
+                    [(t, h) for h, t in pending.items()],
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def size(self) -> Tuple[int, int]:
+        """(number of entries, bytes) of the cache"""
+        self.flush_pending()
+        return self.fetchone(f'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM "{self.table}"')
+
+    def stats(self) -> dict:
+        count, size_bytes = self.size()
+        return {"count": count, "bytes": size_bytes, **self.limits, **self.counters}
+
+    def set_limits(self, max_entries: int = 0, max_bytes: int = 0, max_age: int = 0) -> None:
+        self.limits = {"max_entries": max(max_entries, 0), "max_bytes": max(max_bytes, 0), "max_age": max(max_age, 0)}
+        self.evict_event.set()
+
+    def _evict_batch(self, sql: str, params: tuple = ()) -> int:
+        with self.lock:
+            infohashes = [row[0] for row in self.conn.execute(sql, params).fetchall()]
+            if not infohashes:
+                return 0
+            self.conn.execute("BEGIN")
+            try:
+                self._delete_many(infohashes)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return len(infohashes)
+
+    def evict(self) -> int:
+        """removes expired entries first, then least recently used ones until within limits"""
+        self.flush_access()
+        evicted = 0
+
+        max_age = self.limits["max_age"]
+        if max_age > 0:
+            while True:
+                n = self._evict_batch(
+                    f'SELECT info_hash FROM "{self.table}" WHERE cached_at < ? LIMIT {self.evict_batch}',
+                    (time.time() - max_age,),
+                )
+                self.counters["evicted_expired"] += n
+                evicted += n
+                if n < self.evict_batch:
+                    break
+
+        max_entries, max_bytes = self.limits["max_entries"], self.limits["max_bytes"]
+        while max_entries > 0 or max_bytes > 0:
+            count, size_bytes = self.size()
+            over = max(count - max_entries, 0) if max_entries > 0 else 0
+            if max_bytes > 0 and size_bytes > max_bytes:
+                # pick LRU entries whose sizes add up to the excess
+                excess, n_bytes, n_lru = size_bytes - max_bytes, 0, 0
+                for n_lru, (row_bytes,) in enumerate(
+                    self.fetchall(
+                        f'SELECT size_bytes FROM "{self.table}" ORDER BY last_access LIMIT {self.evict_batch}'
+                    ),
+                    start=1,
+                ):
+                    n_bytes += row_bytes
+                    if n_bytes >= excess:
+                        break
+                over = max(over, n_lru)
+            if over <= 0:
+                break
+            n = self._evict_batch(
+                f'SELECT info_hash FROM "{self.table}" ORDER BY last_access LIMIT {min(over, self.evict_batch)}'
+            )
+            self.counters["evicted_lru"] += n
+            evicted += n
+            if n == 0:
+                break
+
+        if evicted:
+            self.counters["last_eviction"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            logger.debug("Evicted %d entries from torrent cache", evicted)
+        return evicted
+
+    def _evict_loop(self) -> None:
+        try:
+            self.migrate()
+        except Exception:
+            logger.exception("Exception while migrating torrent cache:")
+        while self.evict_thread is not None:
+            self.evict_event.wait(self.evict_interval)
+            self.evict_event.clear()
+            if self.evict_thread is None:
+                break
+            try:
+                self.evict()
+            except Exception:
+                logger.exception("Exception while evicting torrent cache:")
+            time.sleep(1)  # do not spin on bursts of writes
+
+    def start_evictor(self) -> None:
+        if self.evict_thread is None:
+            self.evict_thread = threading.Thread(target=self._evict_loop, daemon=True)
+            self.evict_thread.start()
+
+    def close(self) -> None:
+        thread, self.writer_thread = self.writer_thread, None
+        if thread is not None:
+            self.write_event.set()
+            thread.join(timeout=5)
+        self.flush()
+        thread, self.evict_thread = self.evict_thread, None
+        if thread is not None:
+            self.evict_event.set()
+            thread.join(timeout=5)
+        self.flush_access()
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self.lock:
+            self.conn.close()
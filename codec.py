@@ -0,0 +1,99 @@
+import json
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict
+
+# local
+from .util import size_fmt
+
+
+class Codec(ABC):
+    """binary encoding of cache values
+
+    Every encoded value starts with a one-byte format id so that stored values tell which codec wrote them.
+    """
+
+    format_id: bytes = b""
+    name: str = ""
+    level: int = 6  # zlib compression level
+
+    @abstractmethod
+    def dumps(self, obj) -> bytes:
+        """obj to uncompressed bytes"""
+
+    @abstractmethod
+    def loads(self, data: bytes):
+        """inverse of dumps"""
+
+    def encode(self, obj) -> bytes:
+        return self.format_id + zlib.compress(self.dumps(obj), self.level)
+
+    def decode(self, data: bytes):
+        return self.loads(zlib.decompress(data[1:]))
+
+
+class JsonCodec(Codec):
+    format_id = b"\x01"
+    name = "json+zlib"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+
+CODECS: Dict[bytes, Codec] = {JsonCodec.format_id: JsonCodec()}
+
+
+def default_codec() -> Codec:
+    """the codec new values are written with"""
+    return CODECS[JsonCodec.format_id]
+
+
+def value_format(value: bytes) -> str:
+    """name of the codec a stored value was written by"""
+    codec = CODECS.get(value[:1])
+    return codec.name if codec is not None else "unknown"
+
+
+def decode_value(value: bytes):
+    """decodes codec output by its format id"""
+    codec = CODECS.get(value[:1])
+    if codec is None:
+        raise ValueError(f"Unknown cache value format: {value[:1]!r}")
+    return codec.decode(value)
+
+
+def _strip(entry: dict) -> dict:
+    return {k: v for k, v in entry.items() if not k.endswith("_fmt")}
+
+
+def strip_derived(info: dict) -> dict:
+    """drops human readable fields that can be computed from the stored values"""
+    info = _strip(info)
+    for key in ["files", "tree"]:
+        if key in info:
+            info[key] = [_strip(entry) for entry in info[key]]
+    return info
+
+
+def restore_derived(info: dict) -> dict:
+    if "total_size" in info and "total_size_fmt" not in info:
+        info["total_size_fmt"] = size_fmt(info["total_size"])
+    for key in ["files", "tree"]:
+        for entry in info.get(key, []):
+            if "size_fmt" not in entry:
+                entry["size_fmt"] = size_fmt(entry["size"])
+    return info
+
+
+def strip_files(files: list) -> list:
+    return [_strip(entry) for entry in files]
+
+
+def restore_files(files: list) -> list:
+    for entry in files:
+        if "size_fmt" not in entry:
+            entry["size_fmt"] = size_fmt(entry["size"])
+    return files
@@ -0,0 +1,116 @@
+import threading
+from typing import Dict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# local
+from .setup import P
+
+logger = P.logger
+
+
+class TorrentFetchError(Exception):
+    """torrent url did not give a usable .torrent file"""
+
+
+class FetchResult:
+    def __init__(self, status: int, content: bytes = b"", etag: str = None, last_modified: str = None):
+        self.status = status
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+class HttpClient:
+    """shared keep-alive http client for torrent files
+
+    Connections are pooled per host and the number of concurrent requests to a single host is limited.
+    Bodies are streamed and rejected as soon as they exceed max_bytes or do not look like bencoded data.
+    """
+
+    max_bytes: int = 10 * 1024 * 1024
+    per_host: int = 4  # concurrent requests per host
+    timeout: tuple = (10, 30)  # connect, read
+    chunk_size: int = 64 * 1024
+
+    shared = None
+    shared_lock = threading.Lock()
+
+    def __init__(self, pool_size: int = 32):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=self.per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.host_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self.host_slots[host]
+
+    def fetch_torrent(
+        self, url: str, http_proxy: str = None, etag: str = None, last_modified: str = None
+    ) -> FetchResult:
+        """GET with conditional headers. status 304 means the previously fetched file is still valid"""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        proxies = {"http": http_proxy, "https": http_proxy} if http_proxy else None
+
+        with self._slot(url), self.session.get(
+            url, headers=headers, proxies=proxies, timeout=self.timeout, stream=True
+        ) as resp:
+            if resp.status_code == 304:
+                return FetchResult(304, etag=etag, last_modified=last_modified)
+            resp.raise_for_status()
+            length = resp.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                raise TorrentFetchError(f"Too large: {int(length)} bytes > {self.max_bytes}")
+            chunks, n_bytes = [], 0
+            for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                if not chunk:
+                    continue
+                if not chunks and not chunk.startswith(b"d"):
+                    # bencoded torrent files are dictionaries. most likely an html error page
+                    raise TorrentFetchError(f"Not a torrent file: {chunk[:32]!r}")
+                n_bytes += len(chunk)
+                if n_bytes > self.max_bytes:
+                    raise TorrentFetchError(f"Too large: more than {self.max_bytes} bytes")
+                chunks.append(chunk)
+            content = b"".join(chunks)
+            if not content or b"4:info" not in content:
+                raise TorrentFetchError("Not a torrent file: missing info dictionary")
+            return FetchResult(
+                resp.status_code,
+                content,
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+            )
+
+    def close(self) -> None:
+        self.session.close()
+
+    @classmethod
+    def get_shared(cls) -> "HttpClient":
+        with cls.shared_lock:
+            if cls.shared is None:
+                cls.shared = cls()
+            return cls.shared
+
+    @classmethod
+    def close_shared(cls) -> None:
+        with cls.shared_lock:
+            client, cls.shared = cls.shared, None
+        if client is not None:
+            client.close()
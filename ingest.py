@@ -0,0 +1,178 @@
+import hashlib
+import os
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+# local
+from .setup import P
+from .util import LibTorrent
+
+logger = P.logger
+
+
+def _bencode_end(data: bytes, i: int) -> int:
+    """index just after the bencoded value starting at i"""
+    c = data[i : i + 1]
+    if c == b"i":
+        return data.index(b"e", i) + 1
+    if c in (b"l", b"d"):
+        i += 1
+        while data[i : i + 1] != b"e":
+            if i >= len(data):
+                raise ValueError("truncated bencoded data")
+            i = _bencode_end(data, i)
+        return i + 1
+    colon = data.index(b":", i)
+    return colon + 1 + int(data[i:colon])
+
+
+def info_hash_of(torrent_file: bytes) -> Optional[str]:
+    """v1 info_hash from the raw bytes of the info dictionary, without decoding the rest"""
+    try:
+        if not torrent_file.startswith(b"d"):
+            return None
+        i = 1
+        while torrent_file[i : i + 1] != b"e":
+            key_end = _bencode_end(torrent_file, i)
+            value_end = _bencode_end(torrent_file, key_end)
+            if torrent_file[i:key_end] == b"4:info":
+                return hashlib.sha1(torrent_file[key_end:value_end]).hexdigest()
+            i = value_end
+    except (ValueError, IndexError):
+        pass
+    return None
+
+
+def convert(torrent_file: bytes) -> dict:
+    """runs in worker threads"""
+    return LibTorrent.from_torrent_file(torrent_file).to_dict()
+
+
+def iter_torrent_files(path: str) -> Iterator[Tuple[str, bytes]]:
+    """(name, content) of .torrent files in a directory tree or a zip/tar archive"""
+    if os.path.isdir(path):
+        for root, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(".torrent"):
+                    filepath = os.path.join(root, filename)
+                    with open(filepath, "rb") as f:
+                        yield filepath, f.read()
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for zinfo in zf.infolist():
+                if not zinfo.is_dir() and zinfo.filename.lower().endswith(".torrent"):
+                    yield zinfo.filename, zf.read(zinfo)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as tf:
+            for member in tf:
+                if member.isfile() and member.name.lower().endswith(".torrent"):
+                    yield member.name, tf.extractfile(member).read()
+    else:
+        raise ValueError(f"Not a directory or a zip/tar archive: {path!r}")
+
+
+class IngestJob:
+    """bulk import of .torrent files into the torrent cache
+
+    Files are read in batches. info_hashes already cached are skipped before conversion, the rest are converted
+    in a thread pool and written to the cache in a single transaction per batch.
+    """
+
+    batch_size: int = 500
+
+    def __init__(self, path: str, cache, num_workers: int = None):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.cache = cache
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.counters = {"found": 0, "skipped": 0, "ingested": 0, "failed": 0, "bytes": 0}
+        self.errors: List[str] = []  # first few only
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.cancelled = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name=f"{P.package_name}-ingest", daemon=True)
+        self.thread.start()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def executor(self):
+        # not processes: forking the running server copies its locks mid-use, and spawned workers would have to
+        # import the plugin (.setup) and the server's main module again
+        return ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix=f"{P.package_name}-ingest")
+
+    def run(self) -> None:
+        self.status, self.started_at = "running", time.time()
+        try:
+            with self.executor() as executor:
+                batch = []
+                for name, torrent_file in iter_torrent_files(self.path):
+                    if self.cancelled.is_set():
+                        break
+                    self.counters["found"] += 1
+                    self.counters["bytes"] += len(torrent_file)
+                    batch.append((name, torrent_file))
+                    if len(batch) >= self.batch_size:
+                        self.ingest_batch(executor, batch)
+                        batch = []
+                if batch and not self.cancelled.is_set():
+                    self.ingest_batch(executor, batch)
+            self.status = "cancelled" if self.cancelled.is_set() else "done"
+        except Exception as e:
+            logger.exception("Exception while ingesting torrent files from %r:", self.path)
+            self.status, self.error = "failed", str(e)
+        finally:
+            self.finished_at = time.time()
+            logger.info("Ingestion of %r %s: %s", self.path, self.status, self.counters)
+
+    def ingest_batch(self, executor, batch: List[Tuple[str, bytes]]) -> None:
+        infohashes, unknown = {}, []
+        for name, torrent_file in batch:
+            info_hash = info_hash_of(torrent_file)
+            if info_hash is None:
+                unknown.append((name, torrent_file))  # left to libtorrent to tell what is wrong
+            elif info_hash in infohashes:
+                self.counters["skipped"] += 1  # duplicates within the batch
+            else:
+                infohashes[info_hash] = (name, torrent_file)
+        existing = self.cache.existing(list(infohashes))
+        self.counters["skipped"] += len(existing)
+        todo = [v for h, v in infohashes.items() if h not in existing] + unknown
+
+        items = []
+        futures = [(name, torrent_file, executor.submit(convert, torrent_file)) for name, torrent_file in todo]
+        for name, torrent_file, future in futures:
+            try:
+                items.append((future.result(), torrent_file))
+            except Exception as e:
+                self.counters["failed"] += 1
+                if len(self.errors) < 20:
+                    self.errors.append(f"{name}: {e}")
+        if items:
+            self.cache.put_many(items)
+            self.counters["ingested"] += len(items)
+
+    def to_dict(self) -> dict:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0
+        _dict = {
+            "job_id": self.id,
+            "path": self.path,
+            "status": self.status,
+            **self.counters,
+            "elapsed": elapsed,
+            "files_per_sec": self.counters["found"] / elapsed if elapsed else None,
+            "errors": self.errors,
+        }
+        if self.error is not None:
+            _dict["log"] = self.error
+        return _dict
@@ -0,0 +1,161 @@
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# local
+from .setup import P
+
+logger = P.logger
+
+
+class Job:
+    """a single magnet resolution submitted to JobQueue"""
+
+    def __init__(self, uri: str, func_args: dict, priority: int = 0):
+        self.id = uuid.uuid4().hex
+        self.uri = uri
+        self.func_args = func_args
+        self.priority = priority
+        self.status = "queued"  # queued, running, done, failed
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return self.started_at - self.submitted_at
+
+    @property
+    def run_time(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> dict:
+        _dict = {
+            "job_id": self.id,
+            "uri": self.uri,
+            "status": self.status,
+            "priority": self.priority,
+            "wait_time": self.wait_time,
+            "run_time": self.run_time,
+        }
+        if self.status == "done":
+            _dict["info"] = self.result
+        elif self.status == "failed":
+            _dict["log"] = str(self.error)
+            if hasattr(self.error, "retry_after"):
+                _dict["retry_after"] = self.error.retry_after
+        return _dict
+
+
+class JobQueue:
+    """fixed-size worker pool draining a priority queue of jobs (lower priority value runs first)"""
+
+    job_ttl: int = 60 * 60  # seconds to keep finished jobs for polling
+    max_jobs: int = 10000
+
+    def __init__(self, handler: Callable[[str, dict], dict], num_workers: int = 4):
+        self.handler = handler
+        self.num_workers = max(num_workers, 1)
+        self.queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.jobs: Dict[str, Job] = {}
+        self.workers = []
+        self.busy = 0
+        self.busy_time = 0.0
+        self.started_at = time.time()
+        self.recent = deque(maxlen=200)  # (wait_time, run_time) of finished jobs
+        self.counters = {"submitted": 0, "done": 0, "failed": 0}
+
+    def start(self) -> None:
+        with self.lock:
+            if self.workers:
+                return
+            self.started_at = time.time()
+            for n in range(self.num_workers):
+                worker = threading.Thread(target=self._worker, name=f"{P.package_name}-job-{n}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def stop(self) -> None:
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for _ in workers:
+            self.queue.put((float("inf"), next(self.seq), None))
+        for worker in workers:
+            worker.join(timeout=1)
+
+    def submit(self, uri: str, func_args: dict, priority: int = 0) -> Job:
+        job = Job(uri, func_args, priority=priority)
+        with self.lock:
+            self._prune()
+            if len(self.jobs) >= self.max_jobs:
+                raise RuntimeError(f"Too many jobs in queue: {len(self.jobs)}")
+            self.jobs[job.id] = job
+            self.counters["submitted"] += 1
+        self.queue.put((priority, next(self.seq), job))
+        return job
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[Job]:
+        """returns the job, blocking up to wait seconds until it finishes (long-poll)"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None and wait > 0:
+            job.done.wait(wait)
+        return job
+
+    def _prune(self) -> None:
+        expire = time.time() - self.job_ttl
+        for job_id in [k for k, v in self.jobs.items() if v.finished_at is not None and v.finished_at < expire]:
+            del self.jobs[job_id]
+
+    def _worker(self) -> None:
+        while True:
+            _, _, job = self.queue.get()
+            if job is None:
+                break
+            with self.lock:
+                self.busy += 1
+            job.status, job.started_at = "running", time.time()
+            try:
+                job.result = self.handler(job.uri, job.func_args)
+                job.status = "done"
+            except Exception as e:
+                job.error = e
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+                with self.lock:
+                    self.busy -= 1
+                    self.busy_time += job.run_time
+                    self.counters[job.status] += 1
+                    self.recent.append((job.wait_time, job.run_time))
+
+    def stats(self) -> dict:
+        with self.lock:
+            recent = list(self.recent)
+            uptime = max(time.time() - self.started_at, 1e-6)
+            _stats = {
+                "workers": len(self.workers),
+                "busy": self.busy,
+                "queue_depth": self.queue.qsize(),
+                "utilisation": self.busy_time / (uptime * max(len(self.workers), 1)),
+                **self.counters,
+            }
+        for idx, key in enumerate(["wait_time", "run_time"]):
+            values = [x[idx] for x in recent]
+            _stats[f"{key}_avg"] = sum(values) / len(values) if values else None
+            _stats[f"{key}_max"] = max(values) if values else None
+        return _stats
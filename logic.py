@@ -2,18 +2,37 @@ import json
 import os
 import platform
 import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
 from urllib.parse import quote
 
-import requests
 from flask import Response, jsonify, render_template
 from plugin import F, PluginModuleBase  # pylint: disable=import-error
-from sqlitedict import SqliteDict
 from tool import ToolModalCommand  # pylint: disable=import-error
 from werkzeug.exceptions import MethodNotAllowed
 
+from .admission import AdmissionController, AdmissionRejected
+from .cache import MetadataBackoffError, NegativeCache, TorrentCache
+from .fetch import HttpClient
+from .ingest import IngestJob
+from .jobs import JobQueue
+from .metrics import (
+    CACHE_REQUESTS,
+    LOOKUP_SECONDS,
+    LOOKUPS_IN_FLIGHT,
+    METADATA_FAILURES,
+    METADATA_FETCHES,
+    METADATA_RESOLVED,
+    registry,
+)
+from .response import json_response, make_etag, not_modified
+from .scrape import Scraper, scrape_many
 from .setup import P
-from .util import LibTorrent
+from .tracker import TrackerListUpdater, TrackerStats
+from .transfer import ExportJob, ImportJob, export_lines, gzip_stream
+from .util import LibTorrent, SingleFlight, pathscrub, select_fields, size_fmt, summarize
 
 plugin = P
 logger = plugin.logger
@@ -27,15 +46,43 @@ class LogicMain(PluginModuleBase):
         "use_dht": "False",
         "timeout": "15",
         "n_try": "3",
+        "hedge_delay": "-1",
         "http_proxy": "",
         "pagesize": "20",
+        "batch_concurrency": "8",
+        "job_workers": "4",
+        "admission_max_inflight": "16",
+        "admission_max_per_key": "4",
+        "admission_max_queue": "32",
+        "admission_max_wait": "10",
+        "cache_max_entries": "0",
+        "cache_max_size": "0",
+        "cache_max_age": "0",
+        "scrape_every": "0",
+        "scrape_batch": "500",
         "trackers": "",
         "tracker_last_update": "1970-01-01",
         "tracker_update_every": "30",
         "tracker_update_from": "best",
+        "tracker_max_per_magnet": "30",
+        "tracker_stats": "{}",
+        "tracker_list_validators": "{}",
     }
 
+    lookup_args = ("use_dht", "no_cache", "timeout", "n_try", "hedge_delay")  # api inputs overriding db defaults
+
     torrent_cache = None
+    torrent_meta = None  # bencoded torrent files, stored apart from torrent_cache
+    inflight = SingleFlight()  # concurrent lookups of the same info_hash
+    negative_cache = NegativeCache()  # magnets that timed out recently
+    admission = AdmissionController()  # caps on metadata fetches, configured on load
+    job_queue = None
+    tracker_stats = None
+    ingest_jobs = {}  # job_id -> IngestJob
+    transfer_jobs = {}  # job_id -> ExportJob/ImportJob
+    tracker_updater = None
+    scraper = None
+    lt_version = None  # cached result of is_installed()
 
     tracker_update_from_list = ["best", "all", "all_udp", "all_http", "all_https", "all_ws", "best_ip", "all_ip"]
 
@@ -44,27 +91,63 @@ class LogicMain(PluginModuleBase):
 
     def plugin_load(self):
         try:
+            # libtorrent 세션 상태(DHT) 저장 위치
+            LibTorrent.session_state_dir = os.path.join(F.config["path_data"], "db")
+
             # 토렌트 캐쉬 초기화
             self.cache_init()
+            self.cache_set_limits()
+            self.torrent_cache.start_evictor()
+            self.torrent_cache.start_writer()
+
+            # 동시 조회 제한
+            self.admission_configure()
+
+            # 비동기 조회 작업
+            self.job_queue_init()
+
+            # 트래커 통계
+            self.tracker_stats_init()
 
-            # tracker 자동 업데이트
-            tracker_update_every = ModelSetting.get_int("tracker_update_every")
-            tracker_last_update = ModelSetting.get("tracker_last_update")
-            if tracker_update_every > 0:
-                if (datetime.now() - datetime.strptime(tracker_last_update, "%Y-%m-%d")).days >= tracker_update_every:
-                    self.update_tracker()
+            # tracker 자동 업데이트는 백그라운드에서
+            self.tracker_updater_init()
+            self.tracker_updater.start()
+
+            # 시더/피어 수 갱신
+            LogicMain.scraper = Scraper(self.refresh_swarm_stats, lambda: ModelSetting.get_int("scrape_every"))
+            self.scraper.start()
         except Exception:
             logger.exception("Exception on plugin load:")
 
+    def plugin_unload(self):
+        try:
+            # libtorrent 세션 정리
+            if self.job_queue is not None:
+                self.job_queue.stop()
+            if self.tracker_updater is not None:
+                self.tracker_updater.stop()
+            if self.scraper is not None:
+                self.scraper.stop()
+            for job in list(self.ingest_jobs.values()) + list(self.transfer_jobs.values()):
+                job.cancel()
+            LibTorrent.close_session_pool()
+            HttpClient.close_shared()
+            if self.tracker_stats is not None:
+                self.tracker_stats.maybe_save(force=True)
+            if self.torrent_cache is not None:
+                self.torrent_cache.close()
+        except Exception:
+            logger.exception("Exception on plugin unload:")
+
     def process_menu(self, sub, req):
         _ = req
         arg = ModelSetting.to_dict()
         arg["package_name"] = package_name
         if sub == "setting":
-            arg["trackers"] = "\n".join(json.loads(arg["trackers"]))
-            arg["tracker_update_from_list"] = [
-                [x, f"https://ngosang.github.io/trackerslist/trackers_{x}.txt"] for x in self.tracker_update_from_list
-            ]
+            arg["trackers"] = "\n".join(self.db_trackers())
+            self.tracker_stats_init()
+            arg["tracker_scores"] = self.tracker_stats.table(self.db_trackers())
+            arg["tracker_update_from_list"] = [[x, self.tracker_list_url(x)] for x in self.tracker_update_from_list]
             arg["plugin_ver"] = plugin_info["version"]
 
             # api usage
@@ -76,12 +159,52 @@ class LogicMain(PluginModuleBase):
             arg["t2i_api"] = shlex.join(
                 excmds + [f"{base_api}/t2i", "-d", json.dumps({"apikey": "APIKEY", "url": "TORRENT_URL"})]
             )
+            arg["t2i_batch_api"] = shlex.join(
+                excmds + [f"{base_api}/t2i_batch", "-d", json.dumps({"apikey": "APIKEY", "urls": ["TORRENT_URL"]})]
+            )
+            arg["m2i_batch_api"] = shlex.join(
+                excmds
+                + [f"{base_api}/m2i_batch", "-d", json.dumps({"apikey": "APIKEY", "uris": ["MAGNET_URI", "INFO_HASH"]})]
+            )
+            arg["m2i_submit_api"] = shlex.join(
+                excmds
+                + [f"{base_api}/m2i_submit", "-d", json.dumps({"apikey": "APIKEY", "uri": "MAGNET_URI", "priority": 0})]
+            )
+            arg["m2i_job_api"] = shlex.join(
+                excmds + [f"{base_api}/m2i_job", "-d", json.dumps({"apikey": "APIKEY", "job_id": "JOB_ID", "wait": 30})]
+            )
+            arg["files_api"] = shlex.join(
+                excmds
+                + [
+                    f"{base_api}/files",
+                    "-d",
+                    json.dumps({"apikey": "APIKEY", "info_hash": "INFO_HASH", "q": "", "offset": 0, "limit": 100}),
+                ]
+            )
+            arg["find_files_api"] = shlex.join(
+                excmds + [f"{base_api}/find_files", "-d", json.dumps({"apikey": "APIKEY", "q": "FILE NAME WORDS"})]
+            )
+            arg["ingest_api"] = shlex.join(
+                excmds + [f"{base_api}/ingest", "-d", json.dumps({"apikey": "APIKEY", "path": "/path/to/torrents"})]
+            )
+            arg["import_api"] = shlex.join(
+                excmds
+                + [f"{base_api}/import", "-d", json.dumps({"apikey": "APIKEY", "path": "/path/to/cache.ndjson.gz"})]
+            )
+            arg["scrape_api"] = shlex.join(
+                excmds + [f"{base_api}/scrape", "-d", json.dumps({"apikey": "APIKEY", "info_hashes": ["INFO_HASH"]})]
+            )
+            arg["export_api"] = shlex.join(
+                excmds + [f"{base_api}/export", "-d", json.dumps({"apikey": "APIKEY"}), "-o", "cache.ndjson.gz"]
+            )
             excmds += ["-o", "filename.torrent"]
             arg["m2t_api"] = shlex.join(
                 excmds + [f"{base_api}/m2t", "-d", json.dumps({"apikey": "APIKEY", "uri": "MAGNET_URI"})]
             )
         elif sub == "search":
             arg["cache_size"] = len(self.torrent_cache)
+            arg["cache_stats"] = self.torrent_cache.stats()
+            arg["cache_stats"]["bytes_fmt"] = size_fmt(arg["cache_stats"]["bytes"])
         try:
             return render_template(f"{package_name}_{sub}.html", arg=arg)
         except Exception:
@@ -104,32 +227,64 @@ class LogicMain(PluginModuleBase):
                 name = p.get("name", "")
                 if action == "clear":
                     self.torrent_cache.clear()
+                    self.torrent_meta.clear()
+                    self.negative_cache.clear()
                 elif action == "delete" and infohash:
                     for h in infohash.split(","):
                         if h and h in self.torrent_cache:
                             del self.torrent_cache[h]
+                        if h and h in self.torrent_meta:
+                            del self.torrent_meta[h]
+                # 목록이 그대로면 304
+                etag = None
+                if action == "list":
+                    etag = make_etag(self.torrent_cache.version(), *sorted(p.items()))
+                    resp = not_modified(req, etag)
+                    if resp is not None:
+                        return resp
                 # filtering
                 if name:
-                    info = (val["info"] for val in self.torrent_cache.values() if name.strip() in val["info"]["name"])
+                    search_args = {"name": name}
                 elif infohash:
-                    info = (self.torrent_cache[h]["info"] for h in infohash.split(",") if h and h in self.torrent_cache)
+                    search_args = {"infohashes": [h for h in infohash.split(",") if h]}
                 else:
-                    info = (val["info"] for val in self.torrent_cache.values())
-                info = sorted(info, key=lambda x: x["creation_date"], reverse=True)
-                total = len(info)
-                if p.get("c", ""):
-                    counter = int(p.get("c"))
-                    pagesize = ModelSetting.get_int("pagesize")
-                    if counter == 0:
-                        info = info[:pagesize]
-                    elif counter == len(info):
-                        info = []
-                    else:
-                        info = info[counter : counter + pagesize]
-                # return
+                    search_args = {}
                 if action == "list":
-                    return jsonify({"success": True, "info": info, "total": total})
-                return jsonify({"success": True, "count": len(info)})
+                    # keyset pagination
+                    if p.get("c", ""):
+                        search_args.update(
+                            {"cursor": p.get("cursor") or None, "limit": ModelSetting.get_int("pagesize")}
+                        )
+                    info, total, cursor = self.torrent_cache.search(**search_args)
+                    info = [select_fields(x, p.get("fields")) for x in info]
+                    return json_response(
+                        req, {"success": True, "info": info, "total": total, "cursor": cursor}, etag=etag
+                    )
+                if action == "codec":
+                    return jsonify({"success": True, "codec": self.torrent_cache.codec_stats()})
+                # 나머지는 개수만
+                total = self.torrent_cache.count(**search_args)
+                if action == "stats":
+                    stats = self.torrent_cache.stats()
+                    stats["negative"] = self.negative_cache.stats()
+                    return jsonify({"success": True, "count": total, "stats": stats})
+                return jsonify({"success": True, "count": total})
+            if sub == "metrics":
+                return jsonify({"success": True, "metrics": self.metrics_dict()})
+            if sub == "files":
+                p = req.form.to_dict() if req.method == "POST" else req.args.to_dict()
+                return jsonify(self.list_files(p))
+            if sub == "find_files":
+                p = req.form.to_dict() if req.method == "POST" else req.args.to_dict()
+                return jsonify(self.find_files(p))
+            if sub == "ingest":
+                return jsonify(self.ingest(req.form.to_dict()))
+            if sub == "scrape":
+                infohashes = [h for h in req.form.get("infohash", "").split(",") if h]
+                return jsonify({"success": True, "stats": self.scrape(infohashes)})
+            if sub == "ingest_job":
+                p = req.form.to_dict() if req.method == "POST" else req.args.to_dict()
+                return jsonify(self.ingest_job(p))
             if sub == "tracker_update":
                 self.update_tracker()
                 return jsonify({"success": True})
@@ -169,17 +324,22 @@ class LogicMain(PluginModuleBase):
                 magnet_uri = data.get("uri", "")
                 if not magnet_uri.startswith("magnet"):
                     magnet_uri = "magnet:?xt=urn:btih:" + magnet_uri
-                return self.parse_magnet_uri(magnet_uri, no_cache=True, to_torrent=True)
+                return self.parse_magnet_uri(magnet_uri, to_torrent=True)
         except Exception as e:
             logger.exception("Exception while processing ajax requests:")
             return jsonify({"success": False, "log": str(e)})
 
     def process_api(self, sub, req):
         try:
+            # prometheus scrapes with GET
+            if sub == "metrics":
+                return Response(registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
             # only allow -X POST -H 'Content-Type: application/json'
             if req.method != "POST":
                 raise MethodNotAllowed(valid_methods=["POST"])
             _d = req.get_json()
+            client = str(_d.get("apikey", ""))  # 동시 조회 제한 단위
 
             uri = _d.get("uri", "")
             url = _d.get("url", "")
@@ -190,28 +350,142 @@ class LogicMain(PluginModuleBase):
                         uri = "magnet:?xt=urn:btih:" + uri
 
                     # override db default by api input
-                    func_args = {k: _d[k] for k in ["use_dht", "no_cache", "timeout", "n_try"] if k in _d}
+                    func_args = {k: _d[k] for k in self.lookup_args if k in _d}
+                    func_args["client"] = client
+
+                    # 받아둔 것과 같으면 조회 없이 304
+                    info_hash = LibTorrent.parse_magnet_uri(uri).info_hash
+                    if not func_args.get("no_cache", False):
+                        resp = not_modified(req, self.info_etag(info_hash, _d))
+                        if resp is not None:
+                            CACHE_REQUESTS.inc(result="hit")
+                            self.torrent_cache.touch(info_hash)
+                            return resp
 
                     info = self.parse_magnet_uri(uri, **func_args)
-                    return jsonify({"success": True, "info": info})
+                    if _d.get("summary", False):
+                        info = summarize(info)
+                    info = select_fields(info, _d.get("fields"))
+                    return json_response(req, {"success": True, "info": info}, etag=self.info_etag(info_hash, _d))
                 return jsonify({"success": False, "log": "missing parameter: 'uri'"})
 
+            if sub == "m2i_batch":
+                uris = _d.get("uris", [])
+                if uris and isinstance(uris, list):
+                    # override db default by api input
+                    func_args = {k: _d[k] for k in self.lookup_args if k in _d}
+                    func_args["client"] = client
+
+                    result = self.parse_magnet_uris(uris, **func_args)
+                    for item in result:
+                        if "info" in item:
+                            if _d.get("summary", False):
+                                item["info"] = summarize(item["info"])
+                            item["info"] = select_fields(item["info"], _d.get("fields"))
+                    return json_response(req, {"success": True, "result": result})
+                return jsonify({"success": False, "log": "missing parameter: 'uris'"})
+
+            if sub == "m2i_submit":
+                if uri:
+                    if not uri.startswith("magnet"):
+                        uri = "magnet:?xt=urn:btih:" + uri
+
+                    # override db default by api input
+                    func_args = {k: _d[k] for k in self.lookup_args if k in _d}
+                    func_args["client"] = client
+
+                    # 캐시에 있으면 바로 반환
+                    self.cache_init()
+                    info_hash = LibTorrent.parse_magnet_uri(uri).info_hash
+                    if (not func_args.get("no_cache", False)) and (info_hash in self.torrent_cache):
+                        self.torrent_cache.touch(info_hash)
+                        return jsonify({"success": True, "info": self.torrent_cache[info_hash]["info"]})
+
+                    self.job_queue_init()
+                    job = self.job_queue.submit(uri, func_args, priority=int(_d.get("priority", 0)))
+                    return jsonify({"success": True, **job.to_dict()})
+                return jsonify({"success": False, "log": "missing parameter: 'uri'"})
+
+            if sub == "m2i_job":
+                job_id = _d.get("job_id", "")
+                if job_id:
+                    self.job_queue_init()
+                    job = self.job_queue.get(job_id, wait=min(float(_d.get("wait", 0)), 60))
+                    if job is None:
+                        return jsonify({"success": False, "log": f"no such job: {job_id!r}"})
+                    return jsonify({"success": job.status != "failed", **job.to_dict()})
+                return jsonify({"success": False, "log": "missing parameter: 'job_id'"})
+
+            if sub == "jobs":
+                self.job_queue_init()
+                return jsonify({"success": True, "stats": self.job_queue.stats()})
+
             if sub == "t2i":
                 if url:
-                    info = self.parse_torrent_url(_d.get("url"))
-                    return jsonify({"success": True, "info": info})
+                    info = self.parse_torrent_url(_d.get("url"), no_cache=_d.get("no_cache", False))
+                    etag = self.info_etag(info["info_hash"], _d)
+                    if _d.get("summary", False):
+                        info = summarize(info)
+                    info = select_fields(info, _d.get("fields"))
+                    return json_response(req, {"success": True, "info": info}, etag=etag)
                 return jsonify({"success": False, "log": "missing parameter: 'url'"})
 
+            if sub == "t2i_batch":
+                urls = _d.get("urls", [])
+                if urls and isinstance(urls, list):
+                    result = self.parse_torrent_urls(urls, no_cache=_d.get("no_cache", False))
+                    for item in result:
+                        if "info" in item:
+                            if _d.get("summary", False):
+                                item["info"] = summarize(item["info"])
+                            item["info"] = select_fields(item["info"], _d.get("fields"))
+                    return json_response(req, {"success": True, "result": result})
+                return jsonify({"success": False, "log": "missing parameter: 'urls'"})
+
+            if sub == "files":
+                return jsonify(self.list_files(_d))
+
+            if sub == "find_files":
+                return jsonify(self.find_files(_d))
+
+            if sub == "ingest":
+                return jsonify(self.ingest(_d))
+
+            if sub == "scrape":
+                infohashes = _d.get("info_hashes", [])
+                if infohashes and isinstance(infohashes, list):
+                    return jsonify({"success": True, "stats": self.scrape(infohashes)})
+                return jsonify({"success": False, "log": "missing parameter: 'info_hashes'"})
+
+            if sub == "ingest_job":
+                return jsonify(self.ingest_job(_d))
+
+            if sub == "export":
+                if _d.get("path"):
+                    return jsonify(self.export_cache(_d))
+                return self.export_response(_d)
+
+            if sub == "import":
+                return jsonify(self.import_cache(_d))
+
+            if sub == "transfer_job":
+                return jsonify(self.transfer_job(_d))
+
             if sub == "m2t":
                 if uri:
                     if not uri.startswith("magnet"):
                         uri = "magnet:?xt=urn:btih:" + uri
 
                     # override db default by api input
-                    func_args = {k: _d[k] for k in ["use_dht", "timeout", "n_try"] if k in _d}
+                    func_args = {k: _d[k] for k in self.lookup_args if k in _d}
+                    func_args["client"] = client
 
-                    return self.parse_magnet_uri(uri, no_cache=True, to_torrent=True, **func_args)
+                    return self.parse_magnet_uri(uri, to_torrent=True, **func_args)
                 return jsonify({"success": False, "log": "missing parameter: 'uri'"})
+        except (MetadataBackoffError, AdmissionRejected) as e:
+            resp = jsonify({"success": False, "log": str(e), "retry_after": e.retry_after})
+            resp.headers["Retry-After"] = str(e.retry_after)
+            return resp
         except Exception as e:
             logger.exception("Exception while processing api requests:")
             return jsonify({"success": False, "log": str(e)})
@@ -219,9 +493,57 @@ class LogicMain(PluginModuleBase):
     def cache_init(self):
         if self.torrent_cache is None:
             db_file = os.path.join(F.config["path_data"], "db", f"{package_name}.db")
-            self.torrent_cache = SqliteDict(
-                db_file, tablename=f"{package_name}_cache", encode=json.dumps, decode=json.loads, autocommit=True
+            self.torrent_cache = TorrentCache(db_file, package_name)
+            self.torrent_meta = self.torrent_cache.meta
+
+    def info_etag(self, info_hash: str, p: dict) -> Optional[str]:
+        """etag of a cached info as shaped by summary and fields. None if not cached yet"""
+        self.cache_init()
+        version = self.torrent_cache.entry_version(info_hash)
+        if version is None:
+            return None
+        return make_etag(info_hash, version, bool(p.get("summary", False)), p.get("fields"))
+
+    def metrics_dict(self) -> dict:
+        _dict = registry.to_dict()
+        hits, misses = CACHE_REQUESTS.get(result="hit"), CACHE_REQUESTS.get(result="miss")
+        _dict["cache_hit_ratio"] = hits / (hits + misses) if hits + misses else None
+        self.cache_init()
+        _dict["cache"] = self.torrent_cache.stats()
+        _dict["negative_cache"] = self.negative_cache.stats()
+        _dict["admission"] = self.admission.stats()
+        if self.job_queue is not None:
+            _dict["jobs"] = self.job_queue.stats()
+        return _dict
+
+    def job_queue_init(self):
+        if self.job_queue is None:
+            LogicMain.job_queue = JobQueue(
+                lambda uri, func_args: self.parse_magnet_uri(uri, **func_args),
+                num_workers=ModelSetting.get_int("job_workers"),
             )
+        self.job_queue.start()
+
+    def cache_set_limits(self):
+        self.torrent_cache.set_limits(
+            max_entries=ModelSetting.get_int("cache_max_entries"),
+            max_bytes=ModelSetting.get_int("cache_max_size") * 1024 * 1024,
+            max_age=ModelSetting.get_int("cache_max_age") * 24 * 60 * 60,
+        )
+
+    def admission_configure(self):
+        self.admission.configure(
+            max_inflight=ModelSetting.get_int("admission_max_inflight"),
+            max_per_key=ModelSetting.get_int("admission_max_per_key"),
+            max_queue=ModelSetting.get_int("admission_max_queue"),
+            max_wait=ModelSetting.get_int("admission_max_wait"),
+        )
+
+    def setting_save_after(self, change_list):
+        if any(key.startswith("cache_max_") for key in change_list):
+            self.cache_set_limits()
+        if any(key.startswith("admission_") for key in change_list):
+            self.admission_configure()
 
     def tracker_save(self, req):
         for key, value in req.form.items():
@@ -232,21 +554,67 @@ class LogicMain(PluginModuleBase):
             entity = F.db.session.query(ModelSetting).filter_by(key=key).with_for_update().first()
             entity.value = value
         F.db.session.commit()
+        if self.tracker_updater is not None:
+            self.tracker_updater.event.set()  # 주기가 바뀌었을 수 있음
+
+    def tracker_stats_init(self):
+        if self.tracker_stats is None:
+            LogicMain.tracker_stats = TrackerStats(
+                stats=json.loads(ModelSetting.get("tracker_stats") or "{}"),
+                save_func=lambda stats: ModelSetting.set("tracker_stats", json.dumps(stats)),
+            )
+
+    def default_trackers(self) -> list:
+        """fallback trackers from db, ranked and limited by their scores"""
+        self.tracker_stats_init()
+        trackers = self.db_trackers() or TrackerListUpdater.fallback_trackers
+        return self.tracker_stats.select(trackers, ModelSetting.get_int("tracker_max_per_magnet"))
+
+    @staticmethod
+    def tracker_list_url(name: str) -> str:
+        return f"https://ngosang.github.io/trackerslist/trackers_{name}.txt"
+
+    @staticmethod
+    def db_trackers() -> list:
+        return json.loads(ModelSetting.get("trackers") or "[]")
+
+    def tracker_updater_init(self):
+        if self.tracker_updater is None:
+
+            def is_due() -> bool:
+                tracker_update_every = ModelSetting.get_int("tracker_update_every")
+                if tracker_update_every <= 0:
+                    return False
+                tracker_last_update = datetime.strptime(ModelSetting.get("tracker_last_update"), "%Y-%m-%d")
+                return (datetime.now() - tracker_last_update).days >= tracker_update_every
+
+            def on_update(trackers):
+                if trackers is not None:
+                    ModelSetting.set("trackers", json.dumps(trackers))
+                ModelSetting.set("tracker_last_update", datetime.now().strftime("%Y-%m-%d"))
+
+            LogicMain.tracker_updater = TrackerListUpdater(
+                # https://github.com/ngosang/trackerslist
+                get_url=lambda: self.tracker_list_url(ModelSetting.get("tracker_update_from")),
+                is_due=is_due,
+                on_update=on_update,
+                validators=json.loads(ModelSetting.get("tracker_list_validators") or "{}"),
+                save_validators=lambda x: ModelSetting.set("tracker_list_validators", json.dumps(x)),
+            )
 
     def update_tracker(self):
-        # https://github.com/ngosang/trackerslist
-        src_url = f"https://ngosang.github.io/trackerslist/trackers_{ModelSetting.get('tracker_update_from')}.txt"
-        new_trackers = requests.get(src_url, timeout=30).content.decode("utf8").split("\n\n")[:-1]
-        ModelSetting.set("trackers", json.dumps(new_trackers))
-        ModelSetting.set("tracker_last_update", datetime.now().strftime("%Y-%m-%d"))
+        self.tracker_updater_init()
+        self.tracker_updater.refresh()
 
     def is_installed(self) -> str:
-        try:
-            import libtorrent as lt
-        except ImportError:
-            return ""
-        else:
-            return lt.version
+        if LogicMain.lt_version is None:
+            try:
+                import libtorrent as lt
+            except ImportError:
+                LogicMain.lt_version = ""
+            else:
+                LogicMain.lt_version = lt.version
+        return LogicMain.lt_version
 
     def install(self, show_modal: bool = True) -> dict:
         try:
@@ -261,6 +629,7 @@ class LogicMain(PluginModuleBase):
                     ["msg", "완료되었습니다."],
                 ]
                 ToolModalCommand.start("libtorrent 설치", commands, wait=True, show_modal=show_modal, clear=True)
+                LogicMain.lt_version = None
                 return {"success": True}
             return {"succes": False, "log": "지원하지 않는 시스템입니다."}
         except Exception as e:
@@ -278,12 +647,14 @@ class LogicMain(PluginModuleBase):
                     ["msg", "완료되었습니다."],
                 ]
                 ToolModalCommand.start("libtorrent 삭제", commands, wait=True, show_modal=True, clear=True)
+                LogicMain.lt_version = None
                 return {"success": True}
             return {"succes": False, "log": "지원하지 않는 시스템입니다."}
         except Exception as e:
             logger.exception("Exception while attempting uninstall:")
             return {"success": False, "log": str(e)}
 
+    @LOOKUP_SECONDS.timed(func="parse_magnet_uri")
     def parse_magnet_uri(
         self,
         magnet_uri,
@@ -294,14 +665,19 @@ class LogicMain(PluginModuleBase):
         n_try=None,
         to_torrent=False,
         http_proxy=None,
+        hedge_delay=None,
+        client=None,
     ):
         # default function arguments from db
+        if hedge_delay is None:
+            # use_dht를 직접 지정하면 그대로 따름
+            hedge_delay = ModelSetting.get_int("hedge_delay") if use_dht is None else -1
         if use_dht is None:
             use_dht = ModelSetting.get_bool("use_dht")
         if timeout is None:
             timeout = ModelSetting.get_int("timeout")
         if trackers is None:
-            trackers = json.loads(ModelSetting.get("trackers"))
+            trackers = self.default_trackers()
         if n_try is None:
             n_try = ModelSetting.get_int("n_try")
         if http_proxy is None:
@@ -313,23 +689,288 @@ class LogicMain(PluginModuleBase):
         # 캐시에 있으면...
         self.cache_init()
         if (not no_cache) and (torrent.info_hash in self.torrent_cache):
-            return self.torrent_cache[torrent.info_hash]["info"]
+            self.torrent_cache.touch(torrent.info_hash)
+            if not to_torrent:
+                CACHE_REQUESTS.inc(result="hit")
+                return self.torrent_cache[torrent.info_hash]["info"]
+            if torrent.info_hash in self.torrent_meta:
+                CACHE_REQUESTS.inc(result="hit")
+                return self.torrent_file_response(torrent.info_hash)
+        if not no_cache:
+            CACHE_REQUESTS.inc(result="miss")
 
-        info = torrent.get_metadata(use_dht=use_dht, http_proxy=http_proxy, timeout=timeout, n_try=n_try).to_dict()
+        # 최근에 실패한 마그넷이면 바로 실패
+        if not no_cache:
+            self.negative_cache.check(torrent.info_hash)
+
+        def fetch():
+            mode = "hedged" if hedge_delay >= 0 else "dht" if use_dht else "tracker"
+            # 캐시 적중은 여기까지 오지 않으므로 제한 대상은 실제 조회뿐
+            with self.admission.admit(client):
+                METADATA_FETCHES.inc(mode=mode)
+                try:
+                    with LOOKUPS_IN_FLIGHT.track():
+                        torrent.get_metadata(
+                            use_dht=use_dht,
+                            http_proxy=http_proxy,
+                            timeout=timeout,
+                            n_try=n_try,
+                            hedge_delay=hedge_delay,
+                        )
+                except TimeoutError:
+                    METADATA_FAILURES.inc(mode=mode, reason="timeout")
+                    self.negative_cache.record_failure(torrent.info_hash)
+                    self.tracker_stats_record(torrent, False)
+                    raise
+                except Exception:
+                    METADATA_FAILURES.inc(mode=mode, reason="error")
+                    raise
+            self.tracker_stats_record(torrent, True)
+            self.negative_cache.record_success(torrent.info_hash)
+            METADATA_RESOLVED.inc(mode=mode, resolved_by=torrent.info_plus["resolved_by"])
+            info = torrent.to_dict()
+
+            # caching for later use
+            self.cache_init()
+            self.torrent_cache[info["info_hash"]] = {
+                "info": info,
+            }
+            self.torrent_meta[info["info_hash"]] = torrent.to_file()[0]
+            return torrent
+
+        # 같은 토렌트를 동시에 조회하면 하나만 가져오고 나머지는 결과를 기다림
+        torrent = self.inflight.do(torrent.info_hash, fetch)
 
-        # caching for later use
-        self.cache_init()
-        self.torrent_cache[info["info_hash"]] = {
-            "info": info,
-        }
         if to_torrent:
-            torrent_file, torrent_name = torrent.to_file()
-            resp = Response(torrent_file)
-            resp.headers["Content-Type"] = "application/x-bittorrent"
-            resp.headers["Content-Disposition"] = "attachment; filename*=UTF-8''" + quote(torrent_name + ".torrent")
-            return resp
-        return info
+            return self.torrent_file_response(torrent.info_hash)
+        return self.torrent_cache[torrent.info_hash]["info"]
+
+    def list_files(self, p: dict) -> dict:
+        """a page of the file list of a cached torrent"""
+        info_hash = p.get("info_hash", "").lower()
+        if not info_hash:
+            return {"success": False, "log": "missing parameter: 'info_hash'"}
+        self.cache_init()
+        if info_hash not in self.torrent_cache:
+            return {"success": False, "log": f"not in cache: {info_hash!r}"}
+        offset, limit = int(p.get("offset", 0)), min(int(p.get("limit", 100)), 1000)
+        files, total = self.torrent_cache.files(info_hash, q=p.get("q") or None, offset=offset, limit=limit)
+        return {"success": True, "files": files, "total": total, "offset": offset, "limit": limit}
+
+    def find_files(self, p: dict) -> dict:
+        """cached torrents containing files by name tokens (q) or by exact name/path/size"""
+        self.cache_init()
+        limit = min(int(p.get("limit", 100)), 1000)
+        if p.get("q"):
+            return {"success": True, "info_hashes": self.torrent_cache.find_by_tokens(p["q"], limit=limit)}
+        size = p.get("size")
+        size = int(size) if size not in (None, "") else None
+        if p.get("name") or p.get("path") or size is not None:
+            files = self.torrent_cache.find_files(name=p.get("name"), size=size, path=p.get("path"), limit=limit)
+            return {"success": True, "files": files}
+        return {"success": False, "log": "missing parameter: one of 'q', 'name', 'path', 'size'"}
+
+    def scrape(self, infohashes: list) -> dict:
+        """refreshes seeders/peers of cached entries from their trackers"""
+        self.cache_init()
+        infos = [self.torrent_cache.summary(h.lower()) for h in infohashes if h.lower() in self.torrent_cache]
+        return self.scrape_infos(infos)
+
+    def scrape_infos(self, infos: list) -> dict:
+        if not infos:
+            return {}
+        default_trackers = self.default_trackers()
+        stats = scrape_many(
+            {info["info_hash"]: (info.get("trackers") or default_trackers)[:10] for info in infos},
+            max_workers=ModelSetting.get_int("batch_concurrency"),
+            http_proxy=ModelSetting.get("http_proxy") or None,
+        )
+        self.torrent_cache.update_stats(stats, attempted=[info["info_hash"] for info in infos])
+        return stats
+
+    def refresh_swarm_stats(self) -> int:
+        """scrapes a batch of entries whose stats are older than the refresh interval"""
+        self.cache_init()
+        older_than = time.time() - ModelSetting.get_int("scrape_every") * 60
+        infos = self.torrent_cache.stale_stats(older_than, limit=ModelSetting.get_int("scrape_batch"))
+        return len(self.scrape_infos(infos))
+
+    def ingest(self, p: dict) -> dict:
+        """starts importing .torrent files in a local directory or a zip/tar archive into the cache"""
+        path = p.get("path", "")
+        if not path:
+            return {"success": False, "log": "missing parameter: 'path'"}
+        if not os.path.exists(path):
+            return {"success": False, "log": f"no such file or directory: {path!r}"}
+        self.cache_init()
+        workers = int(p["workers"]) if p.get("workers") else None
+        # 끝난 작업은 최근 것만 남김
+        finished = [k for k, v in self.ingest_jobs.items() if v.finished_at is not None]
+        for job_id in finished[:-20]:
+            del self.ingest_jobs[job_id]
+        job = IngestJob(path, self.torrent_cache, num_workers=workers)
+        self.ingest_jobs[job.id] = job
+        job.start()
+        return {"success": True, **job.to_dict()}
+
+    def ingest_job(self, p: dict) -> dict:
+        job_id = p.get("job_id", "")
+        if not job_id:
+            return {"success": True, "jobs": [job.to_dict() for job in self.ingest_jobs.values()]}
+        job = self.ingest_jobs.get(job_id)
+        if job is None:
+            return {"success": False, "log": f"no such job: {job_id!r}"}
+        if str(p.get("cancel", "")).lower() == "true":
+            job.cancel()
+        return {"success": job.status != "failed", **job.to_dict()}
+
+    def export_response(self, p: dict) -> Response:
+        """streams the whole cache as NDJSON, gzip compressed unless compress is false"""
+        self.cache_init()
+        body = export_lines(self.torrent_cache, with_torrent=bool(p.get("with_torrent", False)))
+        filename = f"{package_name}-{datetime.now():%Y%m%d-%H%M%S}.ndjson"
+        mimetype = "application/x-ndjson"
+        if p.get("compress", True):
+            body, filename, mimetype = gzip_stream(body), filename + ".gz", "application/gzip"
+        resp = Response(body, mimetype=mimetype)
+        resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
+        return resp
+
+    def transfer_job_start(self, job) -> dict:
+        # 끝난 작업은 최근 것만 남김
+        finished = [k for k, v in self.transfer_jobs.items() if v.finished_at is not None]
+        for job_id in finished[:-20]:
+            del self.transfer_jobs[job_id]
+        self.transfer_jobs[job.id] = job
+        job.start()
+        return {"success": True, **job.to_dict()}
+
+    def export_cache(self, p: dict) -> dict:
+        """starts writing the cache to a NDJSON file on this server, gzip compressed if the path ends with .gz"""
+        path = p.get("path", "")
+        if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+            return {"success": False, "log": f"no such directory: {os.path.dirname(path)!r}"}
+        self.cache_init()
+        return self.transfer_job_start(
+            ExportJob(path, self.torrent_cache, with_torrent=bool(p.get("with_torrent", False)))
+        )
+
+    def import_cache(self, p: dict) -> dict:
+        """starts reading a NDJSON export, plain or gzip compressed, into the cache"""
+        path = p.get("path", "")
+        if not path:
+            return {"success": False, "log": "missing parameter: 'path'"}
+        if not os.path.isfile(path):
+            return {"success": False, "log": f"no such file: {path!r}"}
+        conflict = p.get("conflict", "skip")
+        if conflict not in ImportJob.conflicts:
+            return {"success": False, "log": f"conflict must be one of {ImportJob.conflicts}: {conflict!r}"}
+        self.cache_init()
+        return self.transfer_job_start(ImportJob(path, self.torrent_cache, conflict=conflict))
+
+    def transfer_job(self, p: dict) -> dict:
+        job_id = p.get("job_id", "")
+        if not job_id:
+            return {"success": True, "jobs": [job.to_dict() for job in self.transfer_jobs.values()]}
+        job = self.transfer_jobs.get(job_id)
+        if job is None:
+            return {"success": False, "log": f"no such job: {job_id!r}"}
+        if str(p.get("cancel", "")).lower() == "true":
+            job.cancel()
+        return {"success": job.status != "failed", **job.to_dict()}
+
+    def tracker_stats_record(self, torrent: LibTorrent, got_metadata: bool):
+        try:
+            self.tracker_stats_init()
+            self.tracker_stats.record(torrent.tracker_report, got_metadata)
+        except Exception:
+            logger.exception("Exception while recording tracker stats:")
+
+    def torrent_file_response(self, info_hash: str) -> Response:
+        """.torrent file rebuilt from cache without any network access"""
+        torrent_file = self.torrent_meta[info_hash]
+        torrent_name = pathscrub(self.torrent_cache[info_hash]["info"]["name"], os="windows", filename=True)
+        resp = Response(torrent_file)
+        resp.headers["Content-Type"] = "application/x-bittorrent"
+        resp.headers["Content-Disposition"] = "attachment; filename*=UTF-8''" + quote(torrent_name + ".torrent")
+        return resp
 
+    def parse_magnet_uris(
+        self,
+        magnet_uris,
+        use_dht=None,
+        timeout=None,
+        trackers=None,
+        no_cache=False,
+        n_try=None,
+        http_proxy=None,
+        max_workers=None,
+        hedge_delay=None,
+        client=None,
+    ) -> list:
+        """resolves many magnets at once: cached ones immediately, the rest concurrently in a shared session"""
+        # default function arguments from db
+        if hedge_delay is None:
+            hedge_delay = ModelSetting.get_int("hedge_delay") if use_dht is None else -1
+        if use_dht is None:
+            use_dht = ModelSetting.get_bool("use_dht")
+        if timeout is None:
+            timeout = ModelSetting.get_int("timeout")
+        if trackers is None:
+            trackers = self.default_trackers()
+        if n_try is None:
+            n_try = ModelSetting.get_int("n_try")
+        if http_proxy is None:
+            http_proxy = ModelSetting.get("http_proxy")
+        if max_workers is None:
+            max_workers = ModelSetting.get_int("batch_concurrency")
+        if client is not None:
+            # 같은 요청의 항목끼리 API 키별 제한을 두고 다투지 않도록
+            max_workers = self.admission.fan_out(max_workers)
+
+        self.cache_init()
+        result, misses = [], []
+        for uri in magnet_uris:
+            item = {"uri": uri}
+            result.append(item)
+            try:
+                if not uri.startswith("magnet"):
+                    uri = "magnet:?xt=urn:btih:" + uri
+                info_hash = LibTorrent.parse_magnet_uri(uri).info_hash
+                if (not no_cache) and (info_hash in self.torrent_cache):
+                    self.torrent_cache.touch(info_hash)
+                    item.update({"success": True, "info": self.torrent_cache[info_hash]["info"]})
+                else:
+                    misses.append((item, uri))
+            except Exception as e:
+                item.update({"success": False, "log": str(e)})
+
+        def resolve(item, uri):
+            try:
+                info = self.parse_magnet_uri(
+                    uri,
+                    use_dht=use_dht,
+                    timeout=timeout,
+                    trackers=trackers,
+                    no_cache=no_cache,
+                    n_try=n_try,
+                    http_proxy=http_proxy,
+                    hedge_delay=hedge_delay,
+                    client=client,
+                )
+                item.update({"success": True, "info": info})
+            except (MetadataBackoffError, AdmissionRejected) as e:
+                item.update({"success": False, "log": str(e), "retry_after": e.retry_after})
+            except Exception as e:
+                item.update({"success": False, "log": str(e)})
+
+        if misses:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(misses)))) as executor:
+                for item, uri in misses:
+                    executor.submit(resolve, item, uri)
+        return result
+
+    @LOOKUP_SECONDS.timed(func="parse_torrent_file")
     def parse_torrent_file(self, torrent_file: bytes) -> dict:
         info = LibTorrent.from_torrent_file(torrent_file).to_dict()
 
@@ -338,10 +979,51 @@ class LogicMain(PluginModuleBase):
         self.torrent_cache[info["info_hash"]] = {
             "info": info,
         }
+        self.torrent_meta[info["info_hash"]] = torrent_file
         return info
 
-    def parse_torrent_url(self, url: str, http_proxy: str = None) -> dict:
+    @LOOKUP_SECONDS.timed(func="parse_torrent_url")
+    def parse_torrent_url(self, url: str, http_proxy: str = None, no_cache: bool = False) -> dict:
         if http_proxy is None:
             http_proxy = ModelSetting.get("http_proxy")
-        proxies = {"http": http_proxy, "https": http_proxy} if http_proxy else None
-        return self.parse_torrent_file(requests.get(url, proxies=proxies, timeout=30).content)
+
+        # 전에 받은 주소면 조건부 요청으로 변경 여부만 확인
+        self.cache_init()
+        entry = None if no_cache else self.torrent_cache.get_url(url)
+        if entry is not None and entry["info_hash"] not in self.torrent_cache:
+            entry = None
+        validators = {"etag": entry["etag"], "last_modified": entry["last_modified"]} if entry else {}
+
+        result = HttpClient.get_shared().fetch_torrent(url, http_proxy=http_proxy, **validators)
+        if result.not_modified and entry is not None:
+            CACHE_REQUESTS.inc(result="hit")
+            self.torrent_cache.touch(entry["info_hash"])
+            return self.torrent_cache[entry["info_hash"]]["info"]
+        if not no_cache:
+            CACHE_REQUESTS.inc(result="miss")
+
+        info = self.parse_torrent_file(result.content)
+        self.torrent_cache.put_url(url, info["info_hash"], etag=result.etag, last_modified=result.last_modified)
+        return info
+
+    def parse_torrent_urls(self, urls: list, http_proxy: str = None, no_cache: bool = False, max_workers=None) -> list:
+        """downloads many torrent urls concurrently through the shared http client"""
+        if http_proxy is None:
+            http_proxy = ModelSetting.get("http_proxy")
+        if max_workers is None:
+            max_workers = ModelSetting.get_int("batch_concurrency")
+
+        result = [{"url": url} for url in urls]
+
+        def resolve(item):
+            try:
+                info = self.parse_torrent_url(item["url"], http_proxy=http_proxy, no_cache=no_cache)
+                item.update({"success": True, "info": info})
+            except Exception as e:
+                item.update({"success": False, "log": str(e)})
+
+        if result:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(result)))) as executor:
+                for item in result:
+                    executor.submit(resolve, item)
+        return result
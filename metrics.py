@@ -0,0 +1,190 @@
+import functools
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from timeit import default_timer as timer
+from typing import Dict, List, Tuple
+
+LabelValues = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> LabelValues:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: LabelValues) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class Metric(ABC):
+    mtype: str = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.lock = threading.Lock()
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        """(sample name, labels, value) to render"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.mtype}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_fmt_labels(labels)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    mtype = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(_labels(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, k, v) for k, v in self.values.items()]
+
+
+class Gauge(Counter):
+    mtype = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    mtype = "histogram"
+
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60)
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = None):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets or self.default_buckets))
+        self.values: Dict[LabelValues, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self.lock:
+            entry = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[idx] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        stime = timer()
+        try:
+            yield
+        finally:
+            self.observe(timer() - stime, **labels)
+
+    def timed(self, **labels):
+        """decorator version of time()"""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def summary(self) -> Dict[LabelValues, dict]:
+        with self.lock:
+            return {k: {"sum": v[-2], "count": v[-1]} for k, v in self.values.items()}
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for labels, entry in self.values.items():
+                for bound, count in zip(self.buckets, entry):
+                    samples.append((f"{self.name}_bucket", labels + (("le", str(bound)),), count))
+                samples.append((f"{self.name}_bucket", labels + (("le", "+Inf"),), entry[-1]))
+                samples.append((f"{self.name}_sum", labels, entry[-2]))
+                samples.append((f"{self.name}_count", labels, entry[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(f"{self.prefix}_{name}", documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.register(Gauge(f"{self.prefix}_{name}", documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = None) -> Histogram:
+        return self.register(Histogram(f"{self.prefix}_{name}", documentation, buckets=buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        lines = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        _dict = {}
+        for metric in self.metrics.values():
+            if isinstance(metric, Histogram):
+                values = metric.summary().items()
+            else:
+                values = ((k, v) for _, k, v in metric.samples())
+            _dict[metric.name] = [{"labels": dict(k), "value": v} for k, v in values]
+        return _dict
+
+
+registry = Registry("torrent_info")
+
+LOOKUP_SECONDS = registry.histogram("lookup_seconds", "Latency of torrent info lookups by function")
+CACHE_REQUESTS = registry.counter("cache_requests_total", "Torrent cache lookups by result (hit/miss)")
+METADATA_FAILURES = registry.counter(
+    "metadata_failures_total", "Failed metadata fetches by mode (dht/tracker/hedged) and reason (timeout/error)"
+)
+METADATA_FETCHES = registry.counter("metadata_fetches_total", "Metadata fetches by mode (dht/tracker/hedged)")
+METADATA_RESOLVED = registry.counter(
+    "metadata_resolved_total", "Successful metadata fetches by mode and the path that got metadata (resolved_by)"
+)
+LOOKUPS_IN_FLIGHT = registry.gauge("lookups_in_flight", "Metadata fetches currently running")
+ADMISSION_WAITING = registry.gauge("admission_waiting", "Metadata fetches waiting for an admission slot")
+ADMISSION_REJECTED = registry.counter(
+    "admission_rejected_total", "Metadata fetches rejected by admission control by reason (queue_full/timeout)"
+)
+DB_SECONDS = registry.histogram(
+    "db_seconds",
+    "Latency of torrent cache db operations by op (read/write)",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
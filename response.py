@@ -0,0 +1,56 @@
+import gzip
+import hashlib
+from typing import Optional
+
+from flask import Response, jsonify
+
+try:
+    import brotli  # pylint: disable=import-error
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024  # bytes. smaller bodies are sent as they are
+
+
+def make_etag(*parts) -> str:
+    """weak etag value (unquoted) from the parts that determine a response body"""
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:24]
+
+
+def not_modified(req, etag: Optional[str]) -> Optional[Response]:
+    """304 response if the client already holds the body of etag"""
+    if etag is None or not req.if_none_match.contains_weak(etag):
+        return None
+    resp = Response(status=304)
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def compress(req, resp: Response) -> Response:
+    """br if the client accepts it and brotli is installed, gzip otherwise"""
+    resp.vary.add("Accept-Encoding")
+    if resp.status_code != 200 or resp.direct_passthrough or "Content-Encoding" in resp.headers:
+        return resp
+    data = resp.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return resp
+    if brotli is not None and req.accept_encodings["br"]:
+        resp.set_data(brotli.compress(data, quality=5))
+        resp.headers["Content-Encoding"] = "br"
+    elif req.accept_encodings["gzip"]:
+        resp.set_data(gzip.compress(data, compresslevel=6))
+        resp.headers["Content-Encoding"] = "gzip"
+    return resp
+
+
+def json_response(req, payload: dict, etag: str = None) -> Response:
+    """jsonify with conditional requests by etag and content negotiated compression"""
+    resp = not_modified(req, etag)
+    if resp is not None:
+        return resp
+    resp = jsonify(payload)
+    if etag is not None:
+        resp.set_etag(etag, weak=True)
+        resp.headers["Cache-Control"] = "private, no-cache"  # revalidate every time
+    return compress(req, resp)
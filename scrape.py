@@ -0,0 +1,197 @@
+import random
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote_from_bytes, urlparse
+
+import requests
+
+# local
+from .setup import P
+
+logger = P.logger
+
+SwarmStats = Dict[str, int]  # seeders, peers, completed
+
+
+def bdecode(data: bytes, i: int = 0) -> Tuple[object, int]:
+    """(value, index after the value). minimal decoder for scrape responses"""
+    c = data[i : i + 1]
+    if c == b"i":
+        end = data.index(b"e", i)
+        return int(data[i + 1 : end]), end + 1
+    if c == b"l":
+        i, values = i + 1, []
+        while data[i : i + 1] != b"e":
+            value, i = bdecode(data, i)
+            values.append(value)
+        return values, i + 1
+    if c == b"d":
+        i, values = i + 1, {}
+        while data[i : i + 1] != b"e":
+            key, i = bdecode(data, i)
+            values[key], i = bdecode(data, i)
+        return values, i + 1
+    colon = data.index(b":", i)
+    end = colon + 1 + int(data[i:colon])
+    if end > len(data):
+        raise ValueError("truncated bencoded data")
+    return data[colon + 1 : end], end
+
+
+def scrape_url(announce_url: str) -> Optional[str]:
+    """http scrape url by the convention of BEP 48. None if the tracker does not support scraping"""
+    head, _, tail = announce_url.rpartition("/")
+    if not tail.startswith("announce"):
+        return None
+    return f"{head}/scrape{tail[len('announce'):]}"
+
+
+UDP_PER_REQUEST = 74  # BEP 15, info_hashes per scrape packet
+HTTP_PER_REQUEST = 50  # keeps the query string short
+
+
+def http_scrape(
+    announce_url: str, infohashes: List[str], timeout: float = 10, http_proxy: str = None
+) -> Dict[str, SwarmStats]:
+    url = scrape_url(announce_url)
+    if url is None:
+        return {}
+    query = "&".join("info_hash=" + quote_from_bytes(bytes.fromhex(h)) for h in infohashes)
+    proxies = {"http": http_proxy, "https": http_proxy} if http_proxy else None
+    resp = requests.get(url + ("&" if "?" in url else "?") + query, proxies=proxies, timeout=timeout)
+    resp.raise_for_status()
+    decoded, _ = bdecode(resp.content)
+    stats = {}
+    for raw_hash, entry in decoded.get(b"files", {}).items():
+        stats[raw_hash.hex()] = {
+            "seeders": entry.get(b"complete", 0),
+            "peers": entry.get(b"incomplete", 0),
+            "completed": entry.get(b"downloaded", 0),
+        }
+    return stats
+
+
+def udp_scrape(announce_url: str, infohashes: List[str], timeout: float = 10) -> Dict[str, SwarmStats]:
+    """BEP 15: connect, then scrape up to 74 info_hashes per packet"""
+    parsed = urlparse(announce_url)
+    addr = (parsed.hostname, parsed.port or 80)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+
+        transaction_id = random.getrandbits(32)
+        sock.sendto(struct.pack(">QII", 0x41727101980, 0, transaction_id), addr)
+        resp = sock.recv(2048)
+        action, tid, connection_id = struct.unpack(">IIQ", resp[:16])
+        if action != 0 or tid != transaction_id:
+            raise ValueError(f"Invalid connect response from {announce_url}")
+
+        stats = {}
+        for idx in range(0, len(infohashes), UDP_PER_REQUEST):
+            chunk = infohashes[idx : idx + UDP_PER_REQUEST]
+            transaction_id = random.getrandbits(32)
+            packet = struct.pack(">QII", connection_id, 2, transaction_id) + b"".join(bytes.fromhex(h) for h in chunk)
+            sock.sendto(packet, addr)
+            resp = sock.recv(8 + 12 * len(chunk))
+            action, tid = struct.unpack(">II", resp[:8])
+            if action != 2 or tid != transaction_id:
+                raise ValueError(f"Invalid scrape response from {announce_url}: action={action}")
+            for n, info_hash in enumerate(chunk):
+                offset = 8 + 12 * n
+                if len(resp) < offset + 12:
+                    break
+                seeders, completed, leechers = struct.unpack(">III", resp[offset : offset + 12])
+                stats[info_hash] = {"seeders": seeders, "peers": leechers, "completed": completed}
+        return stats
+
+
+def scrape(
+    announce_url: str, infohashes: List[str], timeout: float = 10, http_proxy: str = None
+) -> Dict[str, SwarmStats]:
+    scheme = urlparse(announce_url).scheme
+    if scheme == "udp":
+        if http_proxy:
+            return {}  # an http proxy cannot carry udp, and going direct would leak the address
+        return udp_scrape(announce_url, infohashes, timeout=timeout)
+    if scheme in ("http", "https"):
+        return http_scrape(announce_url, infohashes, timeout=timeout, http_proxy=http_proxy)
+    return {}
+
+
+def scrape_many(
+    trackers_by_hash: Dict[str, List[str]], max_workers: int = 8, timeout: float = 10, http_proxy: str = None
+) -> Dict[str, SwarmStats]:
+    """scrapes info_hashes grouped per tracker, keeping the largest swarm reported for each
+
+    udp trackers are skipped when http_proxy is set.
+    """
+    by_tracker: Dict[str, List[str]] = {}
+    for info_hash, trackers in trackers_by_hash.items():
+        for tracker in trackers:
+            scheme = urlparse(tracker).scheme
+            if scheme not in ("udp", "http", "https") or (scheme == "udp" and http_proxy):
+                continue
+            by_tracker.setdefault(tracker, []).append(info_hash)
+    tasks = []
+    for tracker, hs in by_tracker.items():
+        per_request = UDP_PER_REQUEST if tracker.startswith("udp") else HTTP_PER_REQUEST
+        tasks += [(tracker, hs[idx : idx + per_request]) for idx in range(0, len(hs), per_request)]
+
+    result: Dict[str, SwarmStats] = {}
+    lock = threading.Lock()
+
+    def run(tracker: str, infohashes: List[str]):
+        try:
+            stats = scrape(tracker, infohashes, timeout=timeout, http_proxy=http_proxy)
+        except Exception as e:
+            logger.debug("Failed to scrape %s: %s", tracker, e)
+            return
+        with lock:
+            for info_hash, entry in stats.items():
+                prev = result.get(info_hash)
+                if prev is None or entry["seeders"] + entry["peers"] > prev["seeders"] + prev["peers"]:
+                    result[info_hash] = entry
+
+    if tasks:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+            for tracker, infohashes in tasks:
+                executor.submit(run, tracker, infohashes)
+    return result
+
+
+class Scraper:
+    """refreshes swarm stats of the cached entries updated longest ago, in a background thread"""
+
+    def __init__(self, refresh: Callable[[], int], get_interval: Callable[[], int]):
+        self.refresh = refresh  # returns the number of entries refreshed
+        self.get_interval = get_interval  # minutes, 0 to disable
+        self.event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.last_run: Optional[float] = None
+
+    def _run(self) -> None:
+        while self.thread is not None:
+            interval = self.get_interval()
+            if interval > 0 and (self.last_run is None or time.time() - self.last_run >= interval * 60):
+                self.last_run = time.time()
+                try:
+                    n = self.refresh()
+                    logger.debug("Refreshed swarm stats of %d entries", n)
+                except Exception:
+                    logger.exception("Exception while refreshing swarm stats:")
+            self.event.wait(60)
+            self.event.clear()
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=f"{P.package_name}-scrape", daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        thread, self.thread = self.thread, None
+        if thread is not None:
+            self.event.set()
+            thread.join(timeout=1)
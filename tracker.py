@@ -0,0 +1,231 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+# local
+from .setup import P
+
+logger = P.logger
+
+
+class TrackerStats:
+    """per-tracker announce outcomes used to rank the fallback trackers attached to magnets
+
+    Stats are kept in memory and persisted through save_func (a json-serializable dict) from time to time.
+    """
+
+    min_announces: int = 5  # before a tracker can be demoted
+    demote_below: float = 0.2  # score threshold
+    probe_interval: int = 6 * 60 * 60  # seconds until a demoted tracker is tried again
+    probe_ratio: float = 0.1  # share of slots reserved for re-probing demoted trackers
+    save_interval: int = 5 * 60
+    ema_alpha: float = 0.3  # weight of the latest response time
+
+    def __init__(self, stats: Optional[dict] = None, save_func: Callable[[dict], None] = None):
+        self.lock = threading.Lock()
+        self.stats: Dict[str, dict] = stats or {}
+        self.save_func = save_func
+        self.saved_at = time.time()
+        self.dirty = False
+
+    @staticmethod
+    def _new() -> dict:
+        return {
+            "announces": 0,
+            "successes": 0,
+            "failures": 0,
+            "metadata": 0,  # successful lookups in which the tracker gave peers
+            "response_time": None,
+            "last_success": None,
+            "probe_at": None,  # set while demoted
+        }
+
+    def score(self, url: str) -> float:
+        """0..1, higher is better. unknown trackers get a neutral prior"""
+        entry = self.stats.get(url)
+        if entry is None:
+            return 0.5
+        success_rate = (entry["successes"] + 1) / (entry["announces"] + 2)
+        metadata_rate = (entry["metadata"] + 1) / (entry["successes"] + 2)
+        response_time = entry["response_time"] or 0
+        return success_rate * (0.5 + 0.5 * metadata_rate) / (1 + response_time / 10)
+
+    def record(self, report: Dict[str, dict], got_metadata: bool) -> None:
+        """report: tracker url -> {"response_time", "num_peers", "error"} from LibTorrent.tracker_report"""
+        if not report:
+            return
+        now = time.time()
+        with self.lock:
+            for url, outcome in report.items():
+                entry = self.stats.setdefault(url, self._new())
+                entry["announces"] += 1
+                if "response_time" in outcome:
+                    entry["successes"] += 1
+                    entry["last_success"] = now
+                    rt = outcome["response_time"]
+                    prev = entry["response_time"]
+                    entry["response_time"] = rt if prev is None else self.ema_alpha * rt + (1 - self.ema_alpha) * prev
+                    if got_metadata and outcome.get("num_peers", 0) > 0:
+                        entry["metadata"] += 1
+                    if entry["probe_at"] is not None:
+                        # promoted back after a good probe, starting over with a clean history
+                        entry.update({"announces": 1, "successes": 1, "failures": 0, "probe_at": None})
+                elif "error" in outcome:
+                    entry["failures"] += 1
+                if entry["announces"] >= self.min_announces and self.score(url) < self.demote_below:
+                    if entry["probe_at"] is None:
+                        entry["probe_at"] = now + self.probe_interval
+            self.dirty = True
+        self.maybe_save()
+
+    def is_demoted(self, url: str) -> bool:
+        entry = self.stats.get(url)
+        return entry is not None and entry["probe_at"] is not None
+
+    def select(self, trackers: List[str], limit: int) -> List[str]:
+        """ranked, size-limited subset of trackers with a few due demoted ones for re-probing"""
+        if limit <= 0 or not trackers:
+            return trackers
+        now = time.time()
+        with self.lock:
+            active = [t for t in trackers if not self.is_demoted(t)]
+            due = [t for t in trackers if self.is_demoted(t) and self.stats[t]["probe_at"] <= now]
+            active.sort(key=self.score, reverse=True)
+            n_probe = min(len(due), max(1, int(limit * self.probe_ratio))) if due else 0
+            selected = active[: limit - n_probe] + due[:n_probe]
+            for url in due[:n_probe]:
+                # next probe after another interval unless this one succeeds
+                self.stats[url]["probe_at"] = now + self.probe_interval
+        return selected
+
+    def maybe_save(self, force: bool = False) -> None:
+        if self.save_func is None or not self.dirty:
+            return
+        if not force and time.time() - self.saved_at < self.save_interval:
+            return
+        with self.lock:
+            stats = {url: dict(entry) for url, entry in self.stats.items()}
+            self.dirty = False
+            self.saved_at = time.time()
+        try:
+            self.save_func(stats)
+        except Exception:
+            logger.exception("Exception while saving tracker stats:")
+
+    def table(self, trackers: List[str]) -> List[dict]:
+        """rows for the setting page"""
+        rows = []
+        with self.lock:
+            for url in trackers:
+                entry = self.stats.get(url, self._new())
+                rows.append(
+                    {
+                        "url": url,
+                        "score": round(self.score(url), 3),
+                        "announces": entry["announces"],
+                        "successes": entry["successes"],
+                        "metadata": entry["metadata"],
+                        "response_time": None if entry["response_time"] is None else round(entry["response_time"], 2),
+                        "demoted": entry["probe_at"] is not None,
+                    }
+                )
+        rows.sort(key=lambda x: x["score"], reverse=True)
+        return rows
+
+
+class TrackerListUpdater:
+    """refreshes the fallback tracker list from a remote list in a background thread
+
+    Requests are conditional (ETag/Last-Modified) and retried with exponential backoff. The bundled list is
+    used until the first refresh succeeds.
+    """
+
+    # a few long-lived public trackers
+    fallback_trackers = [
+        "udp://tracker.opentrackr.org:1337/announce",
+        "udp://open.demonii.com:1337/announce",
+        "udp://open.stealth.si:80/announce",
+        "udp://tracker.torrent.eu.org:451/announce",
+        "udp://exodus.desync.com:6969/announce",
+        "udp://tracker.openbittorrent.com:6969/announce",
+        "http://tracker.openbittorrent.com:80/announce",
+    ]
+
+    check_interval: int = 60 * 60  # seconds between checks whether a refresh is due
+    retry_base: int = 60  # seconds before the first retry, doubled on each failure
+    retry_max: int = 6 * 60 * 60
+    timeout: int = 30
+
+    def __init__(
+        self,
+        get_url: Callable[[], str],
+        is_due: Callable[[], bool],
+        on_update: Callable[[List[str]], None],
+        validators: Optional[dict] = None,
+        save_validators: Callable[[dict], None] = None,
+    ):
+        self.get_url = get_url
+        self.is_due = is_due
+        self.on_update = on_update
+        self.validators: Dict[str, dict] = validators or {}  # url -> {"etag", "last_modified"}
+        self.save_validators = save_validators
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+        self.event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> str:
+        """returns "updated", "not_modified" or raises"""
+        url = self.get_url()
+        cached = self.validators.get(url, {})
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        resp = requests.get(url, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304:
+            self.on_update(None)
+            return "not_modified"
+        resp.raise_for_status()
+        trackers = [x.strip() for x in resp.content.decode("utf8").split("\n\n") if x.strip()]
+        if not trackers:
+            raise ValueError(f"Empty tracker list from {url}")
+        self.on_update(trackers)
+        self.validators[url] = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+        if self.save_validators is not None:
+            self.save_validators(self.validators)
+        return "updated"
+
+    def _run(self) -> None:
+        while self.thread is not None:
+            if time.time() >= self.retry_at and self.is_due():
+                try:
+                    result = self.refresh()
+                    logger.info("Tracker list refreshed: %s", result)
+                    self.failures, self.retry_at, self.last_error = 0, 0.0, None
+                except Exception as e:
+                    self.failures += 1
+                    delay = min(self.retry_base * 2 ** (self.failures - 1), self.retry_max)
+                    self.retry_at = time.time() + delay
+                    self.last_error = str(e)
+                    logger.warning("Failed to refresh tracker list (retry in %ds): %s", delay, e)
+            wait = self.check_interval
+            if self.retry_at:
+                wait = max(min(wait, self.retry_at - time.time()), 1)
+            self.event.wait(wait)
+            self.event.clear()
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=f"{P.package_name}-trackers", daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        thread, self.thread = self.thread, None
+        if thread is not None:
+            self.event.set()
+            thread.join(timeout=1)
@@ -0,0 +1,225 @@
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# local
+from .setup import P
+
+logger = P.logger
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def export_lines(cache, with_torrent: bool = False) -> Iterator[bytes]:
+    """one json document per cached entry: {"info", "cached_at"[, "torrent" in base64]}"""
+    for info, cached_at, torrent_file in cache.iter_entries(with_torrent=with_torrent):
+        entry = {"info": info, "cached_at": cached_at}
+        if torrent_file is not None:
+            entry["torrent"] = base64.b64encode(torrent_file).decode("ascii")
+        yield json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """gzip compresses a stream of chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def open_ndjson(path: str):
+    """binary file object of a plain or gzip compressed file, told apart by its content"""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    return gzip.open(path, "rb") if magic == GZIP_MAGIC else open(path, "rb")
+
+
+def is_newer(entry: Tuple[str, float], other: Tuple[str, float]) -> bool:
+    """compares (creation_date, cached_at) of two copies of an entry"""
+    return (entry[0] or "", entry[1] or 0) > (other[0] or "", other[1] or 0)
+
+
+class TransferJob(ABC):
+    """background export/import of the torrent cache, polled like IngestJob"""
+
+    kind: str = ""
+
+    def __init__(self, path: str, cache):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.cache = cache
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.counters: Dict[str, int] = {}
+        self.errors: List[str] = []  # first few only
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.cancelled = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name=f"{P.package_name}-{self.kind}", daemon=True)
+        self.thread.start()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    @abstractmethod
+    def work(self) -> None:
+        """the export or import itself, run in the job thread"""
+
+    def run(self) -> None:
+        self.status, self.started_at = "running", time.time()
+        try:
+            self.work()
+            self.status = "cancelled" if self.cancelled.is_set() else "done"
+        except Exception as e:
+            logger.exception("Exception while %sing torrent cache %r:", self.kind, self.path)
+            self.status, self.error = "failed", str(e)
+        finally:
+            self.finished_at = time.time()
+            logger.info("%s of %r %s: %s", self.kind.capitalize(), self.path, self.status, self.counters)
+
+    @property
+    @abstractmethod
+    def entries(self) -> int:
+        """entries handled so far, for the rate"""
+
+    def to_dict(self) -> dict:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0
+        _dict = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "path": self.path,
+            "status": self.status,
+            **self.counters,
+            "elapsed": elapsed,
+            "entries_per_sec": self.entries / elapsed if elapsed else None,
+            "errors": self.errors,
+        }
+        if self.error is not None:
+            _dict["log"] = self.error
+        return _dict
+
+
+class ExportJob(TransferJob):
+    """writes the whole cache to a NDJSON file, gzip compressed if the path ends with .gz
+
+    The file appears under its name only when complete.
+    """
+
+    kind = "export"
+
+    def __init__(self, path: str, cache, with_torrent: bool = False):
+        super().__init__(path, cache)
+        self.with_torrent = with_torrent
+        self.counters = {"exported": 0, "bytes": 0}
+
+    @property
+    def entries(self) -> int:
+        return self.counters["exported"]
+
+    def work(self) -> None:
+        tmp_path = f"{self.path}.{self.id[:8]}.tmp"
+        opener = gzip.open if self.path.endswith(".gz") else open
+        try:
+            with opener(tmp_path, "wb") as f:
+                for line in export_lines(self.cache, with_torrent=self.with_torrent):
+                    if self.cancelled.is_set():
+                        break
+                    f.write(line)
+                    self.counters["exported"] += 1
+                    self.counters["bytes"] += len(line)
+            if not self.cancelled.is_set():
+                os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class ImportJob(TransferJob):
+    """reads a NDJSON export, plain or gzip compressed, into the cache
+
+    Entries are written in large batches, a transaction each. conflict decides on info_hashes already cached:
+    "skip" leaves them alone, "newer" replaces them when the imported copy has a later creation_date, or the same
+    creation_date and a later cached_at. Duplicates within a batch resolve to the newer copy.
+    """
+
+    kind = "import"
+    batch_size: int = 5000
+    conflicts = ("skip", "newer")
+
+    def __init__(self, path: str, cache, conflict: str = "skip"):
+        super().__init__(path, cache)
+        if conflict not in self.conflicts:
+            raise ValueError(f"conflict must be one of {self.conflicts}: {conflict!r}")
+        self.conflict = conflict
+        self.counters = {"read": 0, "imported": 0, "skipped": 0, "failed": 0}
+
+    @property
+    def entries(self) -> int:
+        return self.counters["read"]
+
+    def work(self) -> None:
+        with open_ndjson(self.path) as f:
+            batch: Dict[str, dict] = {}
+            for lineno, line in enumerate(f, 1):
+                if self.cancelled.is_set():
+                    return
+                if not line.strip():
+                    continue
+                self.counters["read"] += 1
+                try:
+                    entry = json.loads(line)
+                    info_hash = entry["info"]["info_hash"]
+                except (ValueError, KeyError, TypeError) as e:
+                    self.fail(f"line {lineno}: {e}")
+                    continue
+                prev = batch.get(info_hash)
+                if prev is None or is_newer(self.version(entry), self.version(prev)):
+                    batch[info_hash] = entry
+                if prev is not None:
+                    self.counters["skipped"] += 1  # the older of the two copies
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = {}
+            if batch:
+                self.import_batch(batch)
+
+    @staticmethod
+    def version(entry: dict) -> Tuple[str, float]:
+        return entry["info"].get("creation_date", ""), entry.get("cached_at", 0)
+
+    def fail(self, error: str) -> None:
+        self.counters["failed"] += 1
+        if len(self.errors) < 20:
+            self.errors.append(error)
+
+    def import_batch(self, batch: Dict[str, dict]) -> None:
+        existing = self.cache.versions(list(batch))
+        items, cached_at = [], {}
+        for info_hash, entry in batch.items():
+            current = existing.get(info_hash)
+            if current is not None and (self.conflict == "skip" or not is_newer(self.version(entry), current)):
+                self.counters["skipped"] += 1
+                continue
+            try:
+                torrent_file = base64.b64decode(entry["torrent"]) if entry.get("torrent") else None
+            except ValueError as e:
+                self.fail(f"{info_hash}: {e}")
+                continue
+            items.append((entry["info"], torrent_file))
+            if entry.get("cached_at"):
+                cached_at[info_hash] = entry["cached_at"]
+        if items:
+            self.cache.put_many(items, cached_at=cached_at)
+            self.counters["imported"] += len(items)
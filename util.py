@@ -1,11 +1,14 @@
+import hashlib
 import ntpath
+import os
 import re
 import sys
+import threading
 import time
 from copy import copy
 from datetime import datetime
 from timeit import default_timer as timer
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse
 
 # local
@@ -77,6 +80,473 @@ def size_fmt(num: int, suffix: str = "B") -> str:
     return f"{num:.1f} Y{suffix}"
 
 
+def file_tree(files: List[Tuple[str, int]]) -> List[dict]:
+    """top-level entries under the torrent root with their file counts and sizes
+
+    files: (path, size) where path starts with the torrent name for multi-file torrents
+    """
+    tree: Dict[str, dict] = {}
+    for path, size in files:
+        parts = path.replace("\\", "/").split("/")
+        name = parts[1] if len(parts) > 1 else parts[0]
+        entry = tree.setdefault(name, {"name": name, "is_dir": len(parts) > 2, "num_files": 0, "size": 0})
+        entry["num_files"] += 1
+        entry["size"] += size
+    for entry in tree.values():
+        entry["size_fmt"] = size_fmt(entry["size"])
+    return sorted(tree.values(), key=lambda x: (not x["is_dir"], x["name"]))
+
+
+def summarize(info: dict) -> dict:
+    """info without the full file list but with a top-level tree"""
+    summary = {k: v for k, v in info.items() if k != "files"}
+    if "tree" not in summary and "files" in info:
+        summary["tree"] = file_tree((f["path"], f["size"]) for f in info["files"])
+    return summary
+
+
+def select_fields(info: dict, fields) -> dict:
+    """info with the given fields only, or without those prefixed by '-'. fields is a list or comma separated"""
+    if not fields:
+        return info
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    fields = [f.strip() for f in fields if f.strip()]
+    include = {f for f in fields if not f.startswith("-")}
+    exclude = {f[1:] for f in fields if f.startswith("-")}
+    if include:
+        include.add("info_hash")  # to tell entries apart
+    return {k: v for k, v in info.items() if (not include or k in include) and k not in exclude}
+
+
+def alert_tracker_url(alert) -> str:
+    tracker_url = getattr(alert, "tracker_url", None)
+    if callable(tracker_url):
+        return tracker_url()
+    return getattr(alert, "url", "")
+
+
+def alert_info_hash(alert) -> str:
+    """info_hash of the torrent an alert is about, as used for keys in this module"""
+    try:
+        return str(alert.handle.info_hash())
+    except Exception:
+        return ""
+
+
+class SessionRetired(Exception):
+    """the pooled session was replaced or closed before a torrent could be added. get another one"""
+
+
+class MetadataWaiter:
+    """per-torrent state that the alert loop of a session signals to waiting lookups"""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.refcount = 1
+        self.received = threading.Event()
+        self.num_failed = 0  # metadata_failed_alert count. libtorrent keeps asking other peers
+        self.added_at = timer()
+        self.trackers: Dict[str, dict] = {}  # tracker url -> outcome of announces
+        self.listeners: List[threading.Event] = []  # extra events, e.g. of a lookup waiting on several sessions
+
+    def notify(self) -> None:
+        self.received.set()
+        for event in list(self.listeners):
+            event.set()
+
+    def wait(self, deadline: float) -> bool:
+        """block until metadata arrives or the deadline (in timer() seconds) passes"""
+        while not self.handle.has_metadata():
+            timeleft = deadline - timer()
+            if timeleft <= 0:
+                return False
+            self.received.wait(timeleft)
+        return True
+
+
+class PooledSession:
+    """a long-lived libtorrent session shared by lookups with the same settings variant
+
+    A single alert loop per session pops alerts and routes them to the waiter of each torrent.
+    """
+
+    alert_wait_ms: int = 500
+    routed_alerts = (
+        "metadata_received_alert",
+        "metadata_failed_alert",
+        "tracker_announce_alert",
+        "tracker_reply_alert",
+        "tracker_error_alert",
+    )
+
+    def __init__(self, key: tuple, sess, state_file: str = None, port: int = 0):
+        self.key = key
+        self.session = sess
+        self.state_file = state_file
+        self.port = port
+        self.retired = False  # no longer handed out. closed by on_drained once its last torrent is removed
+        self.on_drained: Optional[Callable[["PooledSession"], None]] = None
+        self.created_at = time.time()
+        self.failures = 0  # consecutive errors from the session itself (not timeouts)
+        self.lock = threading.Lock()
+        self.waiters: Dict[str, MetadataWaiter] = {}
+        self.alert_thread = threading.Thread(target=self._alert_loop, daemon=True)
+        self.alert_thread.start()
+
+    @property
+    def num_torrents(self) -> int:
+        with self.lock:
+            return len(self.waiters)
+
+    def _alert_loop(self) -> None:
+        while True:
+            sess = self.session
+            if sess is None:
+                break
+            try:
+                if sess.wait_for_alert(self.alert_wait_ms) is None:
+                    continue
+                for alert in sess.pop_alerts():
+                    self.handle_alert(alert)
+            except Exception:
+                if self.session is None:
+                    break
+                self.failures += 1
+                logger.exception("Exception in alert loop:")
+                time.sleep(self.alert_wait_ms / 1000)
+
+    def handle_alert(self, alert) -> None:
+        alert_type = type(alert).__name__
+        if alert_type not in self.routed_alerts:
+            return
+        info_hash = alert_info_hash(alert)
+        with self.lock:
+            waiter = self.waiters.get(info_hash)
+        if waiter is None:
+            return
+        if alert_type == "metadata_received_alert":
+            waiter.notify()
+        elif alert_type == "metadata_failed_alert":
+            waiter.num_failed += 1
+            logger.debug("Received invalid metadata for %s: %s", info_hash, alert.message())
+        else:
+            now = timer()
+            with self.lock:  # read by tracker_outcomes()
+                outcome = waiter.trackers.setdefault(alert_tracker_url(alert), {})
+                if alert_type == "tracker_announce_alert":
+                    outcome.setdefault("sent", now)
+                elif alert_type == "tracker_reply_alert":
+                    outcome["response_time"] = now - outcome.get("sent", waiter.added_at)
+                    outcome["num_peers"] = outcome.get("num_peers", 0) + alert.num_peers
+                elif alert_type == "tracker_error_alert":
+                    outcome["error"] = alert.message()
+
+    def tracker_outcomes(self, waiter: MetadataWaiter) -> Dict[str, dict]:
+        """copy of the tracker outcomes of waiter, safe while alerts keep arriving"""
+        with self.lock:
+            return {url: dict(outcome) for url, outcome in waiter.trackers.items() if url}
+
+    def add_torrent(self, atp, info_hash: str) -> MetadataWaiter:
+        """add atp to the session or share the waiter if the same torrent is already being fetched"""
+        with self.lock:
+            if self.retired:
+                raise SessionRetired()
+            waiter = self.waiters.get(info_hash)
+            if waiter is not None:
+                waiter.refcount += 1
+                return waiter
+            try:
+                handle = self.session.add_torrent(atp)
+            except Exception:
+                self.failures += 1
+                raise
+            waiter = self.waiters[info_hash] = MetadataWaiter(handle)
+            return waiter
+
+    def remove_torrent(self, info_hash: str) -> None:
+        with self.lock:
+            waiter = self.waiters.get(info_hash)
+            if waiter is None:
+                return
+            waiter.refcount -= 1
+            if waiter.refcount > 0:
+                return
+            del self.waiters[info_hash]
+            try:
+                self.session.remove_torrent(waiter.handle, True)
+                self.failures = 0
+            except Exception:
+                self.failures += 1
+                logger.exception("Exception while removing torrent from session:")
+            drained = self.retired and not self.waiters
+        if drained and self.on_drained is not None:
+            self.on_drained(self)
+
+    def retire(self) -> bool:
+        """stops new lookups from being handed this session. True if none is left in it"""
+        with self.lock:
+            self.retired = True
+            return not self.waiters
+
+    def is_healthy(self, max_failures: int, max_age: int) -> bool:
+        if self.failures >= max_failures:
+            return False
+        if max_age > 0 and time.time() - self.created_at > max_age and self.num_torrents == 0:
+            return False
+        is_listening = getattr(self.session, "is_listening", None)
+        if is_listening is not None and not is_listening():
+            return False
+        return True
+
+    def save_state(self) -> None:
+        """writes DHT routing table of the session to state_file"""
+        if self.state_file is None or self.session is None:
+            return
+        import libtorrent as lt  # pylint: disable=import-error
+
+        try:
+            if hasattr(lt, "write_session_params_buf"):
+                data = lt.write_session_params_buf(self.session.session_state(lt.save_state_flags_t.save_dht_state))
+            else:
+                data = lt.bencode(self.session.save_state(lt.save_state_flags_t.save_dht_state))
+            tmp_file = self.state_file + ".tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(data)
+            os.replace(tmp_file, self.state_file)
+        except Exception:
+            logger.exception("Exception while saving session state:")
+
+    def close(self) -> None:
+        self.save_state()
+        with self.lock:
+            self.retired = True
+            for waiter in self.waiters.values():
+                waiter.notify()
+                try:
+                    self.session.remove_torrent(waiter.handle, True)
+                except Exception:
+                    pass
+            self.waiters.clear()
+        try:
+            self.session.pause()
+            abort = getattr(self.session, "abort", None)
+            if abort is not None:
+                abort()
+        except Exception:
+            logger.exception("Exception while closing session:")
+        self.session = None
+
+
+class SessionPool:
+    """managed pool of persistent libtorrent sessions keyed by settings variant (dht, proxy)
+
+    Reference:
+    https://www.libtorrent.org/reference-Session.html#session
+    """
+
+    max_failures: int = 5
+    max_age: int = 6 * 60 * 60  # recycle idle sessions after this many seconds
+    save_interval: int = 10 * 60  # seconds between saving session states
+    max_ports: int = 8  # listen ports counted from the configured one. the os picks beyond that
+
+    def __init__(self, settings: dict, state_dir: str = None):
+        self.settings = settings
+        self.state_dir = state_dir
+        self.lock = threading.Lock()
+        self.sessions: Dict[tuple, PooledSession] = {}
+        self.retiring: Set[PooledSession] = set()  # unhealthy, closed once their lookups are done
+        self.ports: Set[int] = set()  # held by open sessions, active or retiring
+        self.closed = threading.Event()
+        if state_dir is not None:
+            threading.Thread(target=self._save_loop, daemon=True).start()
+
+    def state_file(self, key: tuple) -> Optional[str]:
+        """only DHT-enabled variants have a routing table worth keeping"""
+        use_dht, http_proxy = key
+        if self.state_dir is None or not use_dht:
+            return None
+        suffix = hashlib.sha1(http_proxy.encode()).hexdigest()[:8] if http_proxy else "direct"
+        return os.path.join(self.state_dir, f"{P.package_name}_session_{suffix}.state")
+
+    def _save_loop(self) -> None:
+        while not self.closed.wait(self.save_interval):
+            with self.lock:
+                sessions = list(self.sessions.values())
+            for psess in sessions:
+                psess.save_state()
+
+    def make_settings(self, use_dht: bool = False, http_proxy: str = None, port: int = None) -> dict:
+        import libtorrent as lt  # pylint: disable=import-error
+
+        settings = copy(self.settings)
+        settings["enable_dht"] = bool(use_dht)
+        settings["alert_mask"] = (
+            lt.alert.category_t.status_notification
+            | lt.alert.category_t.error_notification
+            | lt.alert.category_t.tracker_notification
+        )
+        if port is not None:
+            host = settings["listen_interfaces"].rsplit(":", 1)[0]
+            settings["listen_interfaces"] = f"{host}:{port}"
+        if http_proxy:
+            proxy_url = urlparse(http_proxy)
+            settings.update(
+                {
+                    "proxy_username": proxy_url.username,
+                    "proxy_password": proxy_url.password,
+                    "proxy_hostname": proxy_url.hostname,
+                    "proxy_port": proxy_url.port,
+                    "proxy_type": (
+                        lt.proxy_type_t.http_pw if proxy_url.username and proxy_url.password else lt.proxy_type_t.http
+                    ),
+                    "force_proxy": True,
+                    "anonymous_mode": True,
+                }
+            )
+        return settings
+
+    def _create(self, key: tuple, port: int) -> PooledSession:
+        import libtorrent as lt  # pylint: disable=import-error
+
+        use_dht, http_proxy = key
+        settings = self.make_settings(use_dht=use_dht, http_proxy=http_proxy, port=port)
+        state_file = self.state_file(key)
+        sess = None
+        if state_file is not None and os.path.isfile(state_file):
+            # warm start from the saved DHT routing table
+            try:
+                with open(state_file, "rb") as f:
+                    data = f.read()
+                if hasattr(lt, "read_session_params"):
+                    sess = lt.session(lt.read_session_params(data, lt.save_state_flags_t.save_dht_state))
+                    sess.apply_settings(settings)
+                else:
+                    sess = lt.session(settings)
+                    sess.load_state(lt.bdecode(data))
+                logger.debug("Loaded session state from '%s'", state_file)
+            except Exception:
+                logger.exception("Exception while loading session state:")
+                sess = None
+        if sess is None:
+            sess = lt.session(settings)
+
+        sess.add_extension("ut_metadata")
+        sess.add_extension("ut_pex")
+        sess.add_extension("metadata_transfer")
+        logger.debug("Created libtorrent session: dht=%s proxy=%s", use_dht, bool(http_proxy))
+        psess = PooledSession(key, sess, state_file=state_file, port=port)
+        psess.on_drained = self._close_retired
+        return psess
+
+    def _acquire_port(self) -> int:
+        """lowest listen port not held by an open session, so that sessions do not collide. 0 lets the os pick"""
+        base = int(self.settings["listen_interfaces"].rsplit(":", 1)[1])
+        if not base:
+            return 0
+        for port in range(base, base + self.max_ports):
+            if port not in self.ports:
+                self.ports.add(port)
+                return port
+        return 0
+
+    def _close_retired(self, psess: PooledSession) -> None:
+        psess.on_drained = None  # once
+
+        def close():
+            psess.close()
+            with self.lock:
+                self.retiring.discard(psess)
+                self.ports.discard(psess.port)
+
+        threading.Thread(target=close, daemon=True).start()
+
+    def get(self, use_dht: bool = False, http_proxy: str = None) -> PooledSession:
+        """returns a warm session for the variant, replacing it first if unhealthy
+
+        Lookups still running in the replaced session keep it until they finish, then it is closed.
+        """
+        key = (bool(use_dht), http_proxy or "")
+        with self.lock:
+            psess = self.sessions.get(key)
+            if psess is not None and not psess.is_healthy(self.max_failures, self.max_age):
+                logger.info("Recycling libtorrent session: dht=%s proxy=%s", key[0], bool(key[1]))
+                del self.sessions[key]
+                self.retiring.add(psess)
+                if psess.retire():
+                    self._close_retired(psess)
+                psess = None
+            if psess is None:
+                port = self._acquire_port()
+                try:
+                    psess = self.sessions[key] = self._create(key, port)
+                except Exception:
+                    self.ports.discard(port)
+                    raise
+            return psess
+
+    def add_torrent(
+        self, atp, info_hash: str, use_dht: bool = False, http_proxy: str = None
+    ) -> Tuple[PooledSession, MetadataWaiter]:
+        """adds atp to a session of the variant, getting the replacement if the session was retired meanwhile"""
+        while True:
+            psess = self.get(use_dht=use_dht, http_proxy=http_proxy)
+            try:
+                return psess, psess.add_torrent(atp, info_hash)
+            except SessionRetired:
+                continue
+
+    def close(self) -> None:
+        """saves states and shuts down every session"""
+        self.closed.set()
+        with self.lock:
+            sessions = list(self.sessions.values()) + list(self.retiring)
+            self.sessions.clear()
+            self.retiring.clear()
+            self.ports.clear()
+        for psess in sessions:
+            psess.close()
+
+
+class SingleFlight:
+    """coalesces concurrent calls with the same key so that only the first caller does the work"""
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, "SingleFlight.Call"] = {}
+
+    def do(self, key: str, func):
+        """returns the result of func(), shared with (or borrowed from) concurrent callers of the same key"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = SingleFlight.Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
 class LibTorrent:
     """wrapper class of libtorrent to obtain torrent metadata without downloading"""
 
@@ -104,6 +574,25 @@ class LibTorrent:
     # for internal use
     info_hash: str = None
     info_plus: dict = None
+    tracker_report: Dict[str, dict] = None  # tracker url -> outcome of the last get_metadata
+
+    session_pool: SessionPool = None
+    session_pool_lock = threading.Lock()
+    session_state_dir: str = None  # where session states (DHT routing table) are kept
+
+    @classmethod
+    def get_session_pool(cls) -> SessionPool:
+        with cls.session_pool_lock:
+            if cls.session_pool is None:
+                cls.session_pool = SessionPool(cls.lt_settings, state_dir=cls.session_state_dir)
+            return cls.session_pool
+
+    @classmethod
+    def close_session_pool(cls) -> None:
+        with cls.session_pool_lock:
+            pool, cls.session_pool = cls.session_pool, None
+        if pool is not None:
+            pool.close()
 
     def to_dict(self) -> dict:
         """from libtorrent torrent_info to python dictionary object
@@ -195,32 +684,69 @@ class LibTorrent:
         return _t
 
     @staticmethod
-    def _get_metadata(handle, timeout: int = 15, n_try: int = 3):
-        """retrieve libtorrent (torrent_info and torrent_status) from handle"""
+    def _get_metadata(waiter: MetadataWaiter, timeout: int = 15, n_try: int = 3):
+        """retrieve libtorrent (torrent_info and torrent_status) as soon as metadata_received_alert arrives"""
         max_try = max(n_try, 1)
-        for tryid in range(max_try):
-            timeleft = timeout
-            logger.debug("Trying to get metadata... %d/%d", tryid + 1, max_try)
-            while not handle.has_metadata():
-                time.sleep(0.1)
-                timeleft -= 0.1
-                if timeleft <= 0:
-                    break
+        stime = timer()
+        if not waiter.wait(stime + max_try * timeout):
+            raise TimeoutError(f"Timed out after {max_try}*{timeout} seconds")
 
-            if handle.has_metadata():
-                _info = handle.get_torrent_info()
-                logger.debug("Successfully got metadata after %d*%d+%.2f seconds", tryid, timeout, timeout - timeleft)
-                break
-            if tryid + 1 == max_try:
-                raise TimeoutError(f"Timed out after {max_try}*{timeout} seconds")
+        handle = waiter.handle
+        _info = handle.get_torrent_info()
+        logger.debug("Successfully got metadata after %.2f seconds", timer() - stime)
 
         # peerinfo if possible
         if handle.status(0).num_complete >= 0:
             return _info, handle.status(0)
         return _info, None
 
-    def get_metadata(self, use_dht: bool = False, http_proxy: str = None, timeout: int = 15, n_try: int = 3):
-        """generate libtorrent session from settings_pack
+    def _add_to_session(self, use_dht: bool, http_proxy: str = None) -> Tuple[PooledSession, MetadataWaiter]:
+        psess, waiter = LibTorrent.get_session_pool().add_torrent(
+            self.lt_atp, self.info_hash, use_dht=use_dht, http_proxy=http_proxy
+        )
+        if use_dht:
+            waiter.handle.force_dht_announce()
+        return psess, waiter
+
+    def _race(self, attempts: dict, http_proxy: str, hedge_delay: float, deadline: float) -> str:
+        """runs tracker-only and, after hedge_delay, dht-enabled attempts. returns the mode that got metadata"""
+        event = threading.Event()
+        hedge_at = timer() + hedge_delay
+        try:
+            while True:
+                if "tracker" not in attempts:
+                    attempts["tracker"] = self._add_to_session(False, http_proxy=http_proxy)
+                    attempts["tracker"][1].listeners.append(event)
+                if "dht" not in attempts and timer() >= hedge_at:
+                    attempts["dht"] = self._add_to_session(True, http_proxy=http_proxy)
+                    attempts["dht"][1].listeners.append(event)
+                for mode, (_, waiter) in attempts.items():
+                    if waiter.handle.has_metadata():
+                        logger.debug("Got metadata via %s after %.2f seconds", mode, timer() - hedge_at + hedge_delay)
+                        return mode
+                now = timer()
+                if now >= deadline:
+                    raise TimeoutError(f"Timed out after {deadline - hedge_at + hedge_delay:.0f} seconds (hedged)")
+                event.wait((deadline if "dht" in attempts else min(deadline, hedge_at)) - now)
+                event.clear()
+        finally:
+            for _, waiter in attempts.values():
+                if event in waiter.listeners:
+                    waiter.listeners.remove(event)
+
+    def get_metadata(
+        self,
+        use_dht: bool = False,
+        http_proxy: str = None,
+        timeout: int = 15,
+        n_try: int = 3,
+        hedge_delay: float = None,
+    ):
+        """retrieve metadata using a pooled session built from settings_pack
+
+        hedge_delay: starts tracker-only at once and adds a dht-enabled attempt after this many seconds
+        (0 for both at once). The first one to get metadata wins and the other is cancelled.
+        use_dht is ignored in that case and the winner is recorded as "resolved_by".
 
         Reference:
         https://www.libtorrent.org/reference-Settings.html#settings_pack
@@ -229,44 +755,26 @@ class LibTorrent:
 
         import libtorrent as lt  # pylint: disable=import-error
 
-        # settings
-        settings = copy(self.lt_settings)
-        settings["enable_dht"] = use_dht
-        if http_proxy:
-            proxy_url = urlparse(http_proxy)
-            settings.update(
-                {
-                    "proxy_username": proxy_url.username,
-                    "proxy_password": proxy_url.password,
-                    "proxy_hostname": proxy_url.hostname,
-                    "proxy_port": proxy_url.port,
-                    "proxy_type": (
-                        lt.proxy_type_t.http_pw if proxy_url.username and proxy_url.password else lt.proxy_type_t.http
-                    ),
-                    "force_proxy": True,
-                    "anonymous_mode": True,
-                }
-            )
-
-        # session
-        sess = lt.session(settings)
-
-        sess.add_extension("ut_metadata")
-        sess.add_extension("ut_pex")
-        sess.add_extension("metadata_transfer")
-
-        # handle
-        h = sess.add_torrent(self.lt_atp)
-
-        if use_dht:
-            h.force_dht_announce()
-
+        attempts: Dict[str, Tuple[PooledSession, MetadataWaiter]] = {}
+        stime, sthread = timer(), time.thread_time()
         try:
-            stime = timer()
-            _info, _status = LibTorrent._get_metadata(h, timeout=timeout, n_try=n_try)
-            etime = timer() - stime
+            if hedge_delay is None or hedge_delay < 0:
+                resolved_by = "dht" if use_dht else "tracker"
+                attempts[resolved_by] = self._add_to_session(use_dht, http_proxy=http_proxy)
+                _info, _status = LibTorrent._get_metadata(attempts[resolved_by][1], timeout=timeout, n_try=n_try)
+            else:
+                resolved_by = self._race(attempts, http_proxy, hedge_delay, stime + max(n_try, 1) * timeout)
+                handle = attempts[resolved_by][1].handle
+                _info, _status = handle.get_torrent_info(), handle.status(0)
+                if _status.num_complete < 0:
+                    _status = None
+            etime, ethread = timer() - stime, time.thread_time() - sthread
         finally:
-            sess.remove_torrent(h, True)
+            self.tracker_report = {}
+            for psess, waiter in attempts.values():
+                for url, outcome in psess.tracker_outcomes(waiter).items():
+                    self.tracker_report.setdefault(url, outcome)
+                psess.remove_torrent(self.info_hash)
 
         # create torrent object and generate file stream
         torrent = lt.create_torrent(_info)
@@ -279,6 +787,8 @@ class LibTorrent:
             "trackers": atp.trackers if not isinstance(atp, dict) else atp["trackers"],
             "creation_date": datetime.fromtimestamp(_dict[b"creation date"]).isoformat(),
             "elapsed_time": etime,
+            "elapsed_thread_time": ethread,
+            "resolved_by": resolved_by,
         }
 
         # peerinfo if possible